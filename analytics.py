@@ -0,0 +1,304 @@
+"""Vectorised aggregates over the archived daily snapshots.
+
+Each day is summarised once with NumPy over its columnar Snapshot (job pick
+counts per tier and data center, points distribution per data center, rank
+movement against the previous day, duplicate ids) and the summary is cached
+as JSON in analytics_cache/. Full-history reports combine the cached
+summaries, so only new days are ever computed.
+
+`python analytics.py [--start YYYY-MM-DD] [--end YYYY-MM-DD]` prints a report.
+
+rollups/ holds small CSVs for dashboards (job share, DC population, rank
+movement, top movers, new entrants) that main() extends by one day per run
+with update_rollups.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from archive import Snapshot, archive_dir, archived_days, columnar_dir, delta_path, load_snapshot, read_day, snapshot_name
+
+cache_dir = "./analytics_cache"
+summary_version = 1
+"""Bump when daily_summary changes so cached summaries are recomputed."""
+
+
+def group_counts(snapshot: Snapshot, fields: Sequence[str]) -> Dict[Tuple[str, ...], int]:
+    """Rows per distinct combination of string fields, from one bincount over the combined codes."""
+    sizes = tuple(len(snapshot.categories[f]) for f in fields)
+    key = np.ravel_multi_index([snapshot.columns[f].astype(np.intp) for f in fields], sizes)
+    counts = np.bincount(key, minlength=int(np.prod(sizes)))
+    present = np.flatnonzero(counts)
+    labels = [
+        [snapshot.categories[f][code] for code in codes.tolist()]
+        for f, codes in zip(fields, np.unravel_index(present, sizes))
+    ]
+    return dict(zip(zip(*labels), counts[present].tolist()))
+
+
+def points_stats(snapshot: Snapshot) -> Dict[str, Dict[str, float]]:
+    """Points count/mean/percentiles per data center."""
+    dcs = snapshot.columns["dc"]
+    points = snapshot.columns["points"]
+    order = np.argsort(dcs, kind="stable")
+    bounds = np.flatnonzero(np.diff(dcs[order])) + 1
+    stats = {}
+    for group in np.split(order, bounds):
+        if not len(group):
+            continue
+        p = points[group]
+        p10, p50, p90 = np.percentile(p, [10, 50, 90]).tolist()
+        stats[snapshot.categories["dc"][dcs[group[0]]]] = {
+            "count": len(p),
+            "mean": float(p.mean()),
+            "p10": p10,
+            "p50": p50,
+            "p90": p90,
+            "max": int(p.max()),
+        }
+    return stats
+
+
+def rank_movement(previous: Snapshot, current: Snapshot, top: int = 5) -> Dict[str, Any]:
+    """Day-over-day cur_rank changes for players present on both days, joined on id."""
+    _, ci, pi = np.intersect1d(current.columns["id"], previous.columns["id"], return_indices=True)
+    moves = previous.columns["cur_rank"][pi] - current.columns["cur_rank"][ci]  # positive = climbed
+    climbers = np.argsort(-moves, kind="stable")[:top]
+    names = current.strings("name")
+    return {
+        "compared_to": previous.day.isoformat(),
+        "up": int((moves > 0).sum()),
+        "down": int((moves < 0).sum()),
+        "same": int((moves == 0).sum()),
+        "new": len(current) - len(ci),
+        "dropped": len(previous) - len(pi),
+        "mean_abs_move": float(np.abs(moves).mean()) if len(moves) else 0.0,
+        "top_climbers": [
+            [int(current.columns["id"][ci[i]]), names[ci[i]], int(moves[i])] for i in climbers if moves[i] > 0
+        ],
+    }
+
+
+def duplicate_ids(snapshot: Snapshot) -> Dict[int, int]:
+    """Vectorised check_duplicate_player_ids: id -> count for ids on more than one row."""
+    ids, counts = np.unique(snapshot.columns["id"], return_counts=True)
+    repeated = counts > 1
+    return dict(zip(ids[repeated].tolist(), counts[repeated].tolist()))
+
+
+def daily_summary(current: Snapshot, previous: Optional[Snapshot]) -> Dict[str, Any]:
+    return {
+        "version": summary_version,
+        "day": current.day.isoformat(),
+        "players": len(current),
+        "jobs": [[*k, n] for k, n in sorted(group_counts(current, ("tier", "dc", "job")).items())],
+        "points": points_stats(current),
+        "movement": rank_movement(previous, current) if previous is not None else None,
+        "duplicates": {str(k): v for k, v in duplicate_ids(current).items()},
+    }
+
+
+def source_signature(day: date, directory: str) -> str:
+    path = os.path.join(directory, snapshot_name(day))
+    st = os.stat(path if os.path.exists(path) else delta_path(day))
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def history_summaries(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    directory: str = archive_dir,
+    columnar: str = columnar_dir,
+    cache: str = cache_dir,
+) -> List[Dict[str, Any]]:
+    """Daily summaries for [start, end], computing and caching only days not cached yet.
+
+    A cached summary is reused while its own and the previous day's CSV are
+    unchanged and it was made by the current summary_version.
+    """
+    os.makedirs(cache, exist_ok=True)
+    days = archived_days(directory)
+    summaries = []
+    loaded: Dict[date, Snapshot] = {}
+
+    def snapshot(day: date) -> Snapshot:
+        if day not in loaded:
+            loaded.clear()  # only the current day and the one before are ever needed again
+            loaded[day] = load_snapshot(day, directory, columnar)
+        return loaded[day]
+
+    for i, day in enumerate(days):
+        if (start is not None and day < start) or (end is not None and day > end):
+            continue
+        previous = days[i - 1] if i else None
+        signature = source_signature(day, directory)
+        if previous is not None:
+            signature += "/" + source_signature(previous, directory)
+        path = os.path.join(cache, snapshot_name(day, ".json"))
+        try:
+            with open(path, encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached["version"] == summary_version and cached["signature"] == signature:
+                summaries.append(cached)
+                continue
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        prev_snapshot = snapshot(previous) if previous is not None else None
+        summary = daily_summary(snapshot(day), prev_snapshot)
+        summary["signature"] = signature
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        summaries.append(summary)
+    return summaries
+
+
+def job_share(summaries: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Share of each job within each tier, pooled over every summarised day."""
+    per_tier: Dict[str, Counter] = defaultdict(Counter)
+    for summary in summaries:
+        for tier, _dc, job, n in summary["jobs"]:
+            per_tier[tier][job] += n
+    return {
+        tier: {job: n / sum(jobs.values()) for job, n in jobs.most_common()}
+        for tier, jobs in per_tier.items()
+    }
+
+
+def report(summaries: List[Dict[str, Any]], top: int = 5) -> str:
+    if not summaries:
+        return "no archived days in range"
+    lines = [f"{len(summaries)} day(s), {summaries[0]['day']} to {summaries[-1]['day']}"]
+    lines.append("job share per tier:")
+    for tier, shares in sorted(job_share(summaries).items()):
+        best = ", ".join(f"{job} {share:.1%}" for job, share in list(shares.items())[:top])
+        lines.append(f"  {tier}: {best}")
+    latest = summaries[-1]
+    lines.append(f"points on {latest['day']}:")
+    for dc, stats in sorted(latest["points"].items()):
+        lines.append(f"  {dc}: n={stats['count']} median={stats['p50']:.0f} p90={stats['p90']:.0f} max={stats['max']}")
+    movement = latest["movement"]
+    if movement is not None:
+        lines.append(
+            f"movement vs {movement['compared_to']}: {movement['up']} up, {movement['down']} down, "
+            f"{movement['same']} same, {movement['new']} new, {movement['dropped']} dropped"
+        )
+    busiest = max(summaries, key=lambda s: len(s["duplicates"]))
+    if busiest["duplicates"]:
+        lines.append(f"most duplicate ids: {len(busiest['duplicates'])} on {busiest['day']}")
+    return "\n".join(lines)
+
+
+rollup_dir = "./rollups"
+rollup_top_movers = 10
+rollup_columns: Dict[str, Tuple[str, ...]] = {
+    "job_share.csv": ("day", "tier", "job", "players", "share"),
+    "dc_population.csv": ("day", "dc", "players"),
+    "movement.csv": ("day", "compared_to", "up", "down", "same", "new", "dropped"),
+    "top_movers.csv": ("day", "id", "name", "dc", "prev_rank", "cur_rank", "move"),
+    "new_entrants.csv": ("day", "id", "name", "world", "dc", "cur_rank", "tier", "job"),
+}
+"""Rollup file -> columns. Every file has rows for one day after another."""
+
+
+def rollup_rows(
+    day: date, rows: List[Dict[str, Any]], previous: Optional[Tuple[date, List[Dict[str, Any]]]]
+) -> Dict[str, List[Tuple[Any, ...]]]:
+    """One day's rows for every rollup file, hash-joining rows against the previous day's on player id."""
+    d = day.isoformat()
+    out: Dict[str, List[Tuple[Any, ...]]] = {name: [] for name in rollup_columns}
+
+    jobs = Counter((row["tier"], row["job"]) for row in rows)
+    tiers = Counter(row["tier"] for row in rows)
+    for (tier, job), n in sorted(jobs.items()):
+        out["job_share.csv"].append((d, tier, job, n, round(n / tiers[tier], 6)))
+    for dc, n in sorted(Counter(row["dc"] for row in rows).items()):
+        out["dc_population.csv"].append((d, dc, n))
+
+    if previous is None:
+        return out
+    before = {row["id"]: row["cur_rank"] for row in previous[1]}
+    moved = []
+    new = []
+    for row in rows:
+        rank = before.get(row["id"])
+        if rank is None:
+            new.append(row)
+        else:
+            moved.append((rank - row["cur_rank"], rank, row))  # positive = climbed
+    moves = Counter((m > 0) - (m < 0) for m, _, _ in moved)
+    dropped = len(before.keys() - {row["id"] for row in rows})
+    out["movement.csv"].append((d, previous[0].isoformat(), moves[1], moves[-1], moves[0], len(new), dropped))
+    moved.sort(key=lambda m: m[0], reverse=True)
+    climbers = [m for m in moved[:rollup_top_movers] if m[0] > 0]
+    fallers = [m for m in moved[::-1][:rollup_top_movers] if m[0] < 0]
+    for move, rank, row in climbers + fallers:
+        out["top_movers.csv"].append((d, row["id"], row["name"], row["dc"], rank, row["cur_rank"], move))
+    for row in new:
+        out["new_entrants.csv"].append(
+            (d, row["id"], row["name"], row["world"], row["dc"], row["cur_rank"], row["tier"], row["job"])
+        )
+    return out
+
+
+def update_rollups(directory: str = archive_dir, rollups: str = rollup_dir) -> int:
+    """Append rollup rows for archived days newer than the last rolled-up one.
+
+    The last rolled-up day is always redone, since save_rankings may have
+    rewritten it: rollups/state.json records where its rows start in every
+    file, so redoing it is a truncate. Each day is read once and joined only
+    against the day before it. Returns the number of days rolled up.
+    """
+    os.makedirs(rollups, exist_ok=True)
+    state_path = os.path.join(rollups, "state.json")
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        state = {"day": None, "offsets": {}}
+    last = date.fromisoformat(state["day"]) if state["day"] else None
+    for name, offset in state["offsets"].items():
+        with open(os.path.join(rollups, name), "r+b") as f:
+            f.truncate(offset)
+
+    days = archived_days(directory)
+    todo = [day for day in days if last is None or day >= last]
+    previous = None
+    if todo and days.index(todo[0]) > 0:
+        before = days[days.index(todo[0]) - 1]
+        previous = (before, read_day(before, directory))
+    offsets: Dict[str, int] = {}
+    for day in todo:
+        rows = read_day(day, directory)
+        for name, new_rows in rollup_rows(day, rows, previous).items():
+            path = os.path.join(rollups, name)
+            with open(path, "a", encoding="utf-8", newline="") as f:
+                w = csv.writer(f)
+                if f.tell() == 0:
+                    w.writerow(rollup_columns[name])
+                offsets[name] = f.tell()
+                w.writerows(new_rows)
+        previous = (day, rows)
+    if todo:
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump({"day": todo[-1].isoformat(), "offsets": offsets}, f)
+    return len(todo)
+
+
+def cli(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="analytics.py", description=__doc__.split("\n")[0])
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    args = parser.parse_args(argv)
+    print(report(history_summaries(args.start, args.end)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
@@ -0,0 +1,611 @@
+"""Reading and writing the daily ranking snapshots.
+
+archive/YYYY_MM_DD.csv is the canonical record, unless delta/ is in use (see
+below). columnar/ is a local cache, not committed, of each day as a columnar
+.npz, much faster to load: integer columns are int64 arrays and string columns
+are dictionary encoded as integer codes into the day's distinct values. A
+columnar file older than the CSV or delta it was built from is ignored.
+
+Build or refresh it with `python archive.py convert`. `python archive.py
+index` builds an index from player id to every archived row, which
+`python archive.py history <id>` extends by any new days and then uses to print
+a player's history without scanning the archive.
+
+iter_archive streams typed rows from any range of days in one normalised
+schema, whichever version of the CSV format each day was written in.
+
+`python archive.py delta` stores the archive compactly in delta/: each day as
+only the fields that changed since the day before, with a full keyframe every
+delta_keyframe_interval days. `python archive.py restore <day>` reproduces a
+day's CSV byte for byte. Once delta/ exists, new days are stored only there,
+and `python archive.py delta --prune` drops the CSVs of days already encoded.
+Every reader here lists days with archived_days and reads them with read_text
+or read_day, which rebuild a day from delta/ when it has no CSV.
+"""
+import argparse
+import concurrent.futures
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from collections import deque
+from datetime import date, datetime
+from typing import Any, BinaryIO, Callable, Collection, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+player_schema: Tuple[Tuple[str, type], ...] = (
+    ("name", str),
+    ("id", int),
+    ("cur_rank", int),
+    ("prev_rank", int),
+    ("world", str),
+    ("dc", str),
+    ("points", int),
+    ("points_delta", int),
+    ("portrait", str),
+    ("tier", str),
+    ("wins", int),
+    ("wins_delta", int),
+    ("job", str),
+)
+"""Column names and types of a Player row, in archive CSV column order."""
+player_fields = tuple(name for name, _ in player_schema)
+int_fields = tuple(name for name, type_ in player_schema if type_ is int)
+str_fields = tuple(name for name, type_ in player_schema if type_ is str)
+
+archive_dir = "./archive"
+columnar_dir = "./columnar"
+delta_dir = "./delta"
+
+
+def snapshot_name(day: date, suffix: str = ".csv") -> str:
+    return day.strftime("%Y_%m_%d") + suffix
+
+
+def snapshot_day(filename: str) -> date:
+    """The UTC day a snapshot file is for, from its YYYY_MM_DD.* name."""
+    return datetime.strptime(os.path.basename(filename).split(".")[0], "%Y_%m_%d").date()
+
+
+def list_days(directory: str, suffix: str = ".csv") -> List[date]:
+    """Days with a snapshot in directory, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(snapshot_day(name) for name in names if name.endswith(suffix))
+
+
+def archived_days(directory: str = archive_dir, delta: str = delta_dir) -> List[date]:
+    """Days in the archive, whether as a CSV or only in delta/, oldest first."""
+    return sorted(set(list_days(directory)) | set(list_days(delta, ".json.gz")))
+
+
+def read_text(day: date, directory: str = archive_dir, delta: str = delta_dir) -> str:
+    """A day's CSV exactly as archived, rebuilt from delta/ if it has no CSV."""
+    path = os.path.join(directory, snapshot_name(day))
+    if not os.path.exists(path) and os.path.exists(delta_path(day, delta)):
+        return restore_text(day, delta)
+    with open(path, encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+class Snapshot:
+    """One day's leaderboard as columns.
+
+    columns maps every schema field to an array: int64 values for integer fields,
+    and for string fields uint32 codes into categories[field], the day's distinct
+    values in sorted order. Fields missing from an old CSV are 0 or "".
+    """
+
+    def __init__(self, day: date, columns: Dict[str, np.ndarray], categories: Dict[str, List[str]]):
+        self.day = day
+        self.columns = columns
+        self.categories = categories
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def strings(self, field: str) -> np.ndarray:
+        """Decode a string column."""
+        return np.array(self.categories[field], dtype=object)[self.columns[field]]
+
+    def rows(self) -> List[Tuple[Any, ...]]:
+        """Rows in schema order, as save_rankings writes them."""
+        decoded = [
+            self.strings(name).tolist() if name in self.categories else self.columns[name].tolist()
+            for name in player_fields
+        ]
+        return list(zip(*decoded))
+
+    @classmethod
+    def from_rows(cls, day: date, header: Sequence[str], rows: Iterable[Sequence[Any]]) -> "Snapshot":
+        """Build a snapshot from CSV-style rows (values as strings or already typed)."""
+        raw = list(zip(*rows))
+        n = len(raw[0]) if raw else 0
+        by_name = dict(zip(header, raw))
+        columns: Dict[str, np.ndarray] = {}
+        categories: Dict[str, List[str]] = {}
+        for name in int_fields:
+            values = by_name.get(name)
+            columns[name] = (
+                np.array(values, dtype=np.int64) if values is not None else np.zeros(n, dtype=np.int64)
+            )
+        for name in str_fields:
+            values = by_name.get(name, ("",) * n)
+            distinct, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+            categories[name] = distinct.tolist()
+            columns[name] = codes.astype(np.uint32)
+        return cls(day, columns, categories)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "Snapshot":
+        with open(path, encoding="utf-8", newline="") as f:
+            r = csv.reader(f)
+            header = next(r)
+            return cls.from_rows(snapshot_day(path), header, r)
+
+    # On disk every day is four arrays, since per-array overhead dominates loading
+    # ~1,000 rows: the int columns stacked, the codes stacked, how many categories
+    # each string field has, and all categories as one NUL-separated UTF-8 blob.
+
+    def save(self, path: str):
+        values = [v for name in str_fields for v in self.categories[name]]
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f,
+                ints=np.stack([self.columns[name] for name in int_fields]),
+                codes=np.stack([self.columns[name] for name in str_fields]),
+                counts=np.array([len(self.categories[name]) for name in str_fields], dtype=np.uint32),
+                blob=np.frombuffer("\0".join(values).encode("utf-8"), dtype=np.uint8),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Snapshot":
+        with np.load(path) as npz:
+            ints, codes, counts, blob = npz["ints"], npz["codes"], npz["counts"], npz["blob"]
+        columns = dict(zip(int_fields, ints))
+        columns.update(zip(str_fields, codes))
+        values = blob.tobytes().decode("utf-8").split("\0")
+        categories: Dict[str, List[str]] = {}
+        start = 0
+        for name, count in zip(str_fields, counts.tolist()):
+            categories[name] = values[start : start + count]
+            start += count
+        return cls(snapshot_day(path), columns, categories)
+
+
+def write_columnar(day: date, rows: Iterable[Sequence[Any]], directory: str = columnar_dir) -> str:
+    """Store one day's schema-ordered rows as columnar/YYYY_MM_DD.npz."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, snapshot_name(day, ".npz"))
+    Snapshot.from_rows(day, player_fields, rows).save(path)
+    return path
+
+
+def fresh_columnar(
+    day: date, directory: str = archive_dir, columnar: str = columnar_dir, delta: str = delta_dir
+) -> Optional[str]:
+    """The day's columnar file, unless it is missing or older than the CSV (or delta) it was built from."""
+    path = os.path.join(columnar, snapshot_name(day, ".npz"))
+    try:
+        built = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    for source in (os.path.join(directory, snapshot_name(day)), delta_path(day, delta)):
+        if os.path.exists(source):
+            return path if built >= os.stat(source).st_mtime else None
+    return path
+
+
+def load_snapshot(
+    day: date, directory: str = archive_dir, columnar: str = columnar_dir, delta: str = delta_dir
+) -> Snapshot:
+    """Load one day, from its columnar file when that is up to date, else from the
+    CSV, else rebuilt from delta/."""
+    path = fresh_columnar(day, directory, columnar, delta)
+    if path is not None:
+        return Snapshot.load(path)
+    path = os.path.join(directory, snapshot_name(day))
+    if not os.path.exists(path) and os.path.exists(delta_path(day, delta)):
+        return Snapshot.from_rows(day, *parse_csv(restore_text(day, delta)))
+    return Snapshot.from_csv(path)
+
+
+def load_history(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    directory: str = archive_dir,
+    columnar: str = columnar_dir,
+    delta: str = delta_dir,
+) -> List[Snapshot]:
+    """Load every archived day in [start, end], oldest first."""
+    return [
+        load_snapshot(day, directory, columnar, delta)
+        for day in archived_days(directory, delta)
+        if (start is None or day >= start) and (end is None or day <= end)
+    ]
+
+
+def convert_archive(
+    directory: str = archive_dir, columnar: str = columnar_dir, overwrite: bool = False, delta: str = delta_dir
+) -> int:
+    """Backfill columnar files for archived days, and rebuild those older than their
+    CSV; returns how many were written."""
+    os.makedirs(columnar, exist_ok=True)
+    written = 0
+    for day in archived_days(directory, delta):
+        if not overwrite and fresh_columnar(day, directory, columnar, delta) is not None:
+            continue
+        Snapshot.from_rows(day, *parse_csv(read_text(day, directory, delta))).save(
+            os.path.join(columnar, snapshot_name(day, ".npz"))
+        )
+        written += 1
+    return written
+
+
+def normalise_portrait(portrait: str) -> str:
+    """Drop the _96x96 size suffix portraits had until 2024-11-14, so a portrait compares equal across the archive."""
+    return portrait.replace("_96x96.", ".", 1)
+
+
+def row_normaliser(header: Sequence[str]) -> Callable[[Sequence[str]], Dict[str, Any]]:
+    """A function turning a CSV row with this header into a dict with every
+    player_schema field, typed and with a normalised portrait. Fields an older
+    file lacks are 0 or ""."""
+    columns = [(name, type_, header.index(name) if name in header else None) for name, type_ in player_schema]
+
+    def normalise(values: Sequence[str]) -> Dict[str, Any]:
+        row = {name: type_(values[i]) if i is not None else type_() for name, type_, i in columns}
+        row["portrait"] = normalise_portrait(row["portrait"])
+        return row
+
+    return normalise
+
+
+def read_day(
+    day: date, directory: str = archive_dir, dcs: Optional[Collection[str]] = None, delta: str = delta_dir
+) -> List[Dict[str, Any]]:
+    """One archived day as normalised rows, optionally only those in the given data centers."""
+    path = os.path.join(directory, snapshot_name(day))
+    if os.path.exists(path):
+        f = open(path, encoding="utf-8", newline="")
+    else:
+        f = io.StringIO(read_text(day, directory, delta), newline="")
+    with f:
+        r = csv.reader(f)
+        header = next(r)
+        normalise = row_normaliser(header)
+        if dcs is None:
+            return [normalise(values) for values in r]
+        dc_column = header.index("dc")
+        return [normalise(values) for values in r if values[dc_column] in dcs]
+
+
+def iter_archive(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    dcs: Optional[Iterable[str]] = None,
+    directory: str = archive_dir,
+    workers: int = 0,
+    delta: str = delta_dir,
+) -> Iterator[Tuple[date, Dict[str, Any]]]:
+    """Stream (day, row) for every archived row in [start, end], oldest day first.
+
+    Rows are normalised as by row_normaliser, so every schema version of the
+    archive reads the same. Days outside the range are skipped by file name and
+    at most one day (or, with workers, a couple of days per worker) is held in
+    memory at a time. With workers > 0, files are parsed ahead in that many
+    processes.
+    """
+    wanted = None if dcs is None else frozenset(dcs)
+    days = [
+        day for day in archived_days(directory, delta) if (start is None or day >= start) and (end is None or day <= end)
+    ]
+    if workers <= 0:
+        for day in days:
+            for row in read_day(day, directory, wanted, delta):
+                yield day, row
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending: Deque[Tuple[date, concurrent.futures.Future]] = deque()
+        for day in days:
+            pending.append((day, executor.submit(read_day, day, directory, wanted, delta)))
+            if len(pending) >= 2 * workers:
+                done, rows = pending.popleft()
+                for row in rows.result():
+                    yield done, row
+        while pending:
+            done, rows = pending.popleft()
+            for row in rows.result():
+                yield done, row
+
+
+index_path = "./index/player_history.idx"
+index_dtype = np.dtype([("id", "<i8"), ("day", "<i4"), ("offset", "<u4")])
+"""One index record per archived row: player id, day ordinal, byte offset of the row in its CSV."""
+
+
+def open_day_bytes(day: date, directory: str = archive_dir, delta: str = delta_dir) -> BinaryIO:
+    """A day's CSV opened in binary, or its bytes as rebuilt from delta/."""
+    path = os.path.join(directory, snapshot_name(day))
+    if not os.path.exists(path) and os.path.exists(delta_path(day, delta)):
+        return io.BytesIO(restore_text(day, delta).encode("utf-8"))
+    return open(path, "rb")
+
+
+def csv_row_offsets(f: BinaryIO) -> List[Tuple[int, int]]:
+    """(player id, byte offset) of every data row in an archive CSV opened in binary."""
+    found = []
+    with f:
+        header = next(csv.reader([f.readline().decode("utf-8")]))
+        id_column = header.index("id")
+        offset = f.tell()
+        for line in f:
+            text = line.decode("utf-8")
+            # names are the only field that can be quoted, so skip the csv module when none is
+            fields = text.split(",", id_column + 1) if '"' not in text else next(csv.reader([text]))
+            found.append((int(fields[id_column]), offset))
+            offset += len(line)
+    return found
+
+
+def index_records(day: date, directory: str = archive_dir, delta: str = delta_dir) -> np.ndarray:
+    rows = csv_row_offsets(open_day_bytes(day, directory, delta))
+    records = np.zeros(len(rows), dtype=index_dtype)
+    if rows:
+        records["id"], records["offset"] = zip(*rows)
+    records["day"] = day.toordinal()
+    return records
+
+
+def update_index(directory: str = archive_dir, path: str = index_path, delta: str = delta_dir) -> int:
+    """Append index records for archived days newer than the last indexed one.
+
+    The last indexed day is always re-indexed, since save_rankings may have
+    rewritten it. Building from scratch is the same call without an index file.
+    Returns the number of days indexed.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    last = None
+    if os.path.exists(path) and os.path.getsize(path):
+        index = np.memmap(path, dtype=index_dtype, mode="r")
+        last = int(index["day"][-1])
+        keep = int(np.searchsorted(index["day"], last))  # records are in day order
+        del index
+        with open(path, "r+b") as f:
+            f.truncate(keep * index_dtype.itemsize)
+    days = [day for day in archived_days(directory, delta) if last is None or day.toordinal() >= last]
+    with open(path, "ab") as f:
+        for day in days:
+            index_records(day, directory, delta).tofile(f)
+    return len(days)
+
+
+def player_history(
+    pid: int, directory: str = archive_dir, path: str = index_path, delta: str = delta_dir
+) -> List[Tuple[date, Dict[str, Any]]]:
+    """Every archived (day, row) for a player, oldest first, read straight from the indexed
+    offsets. Days kept only in delta/ are rebuilt first, which is much slower."""
+    index = np.fromfile(path, dtype=index_dtype)
+    history = []
+    for ordinal, offset in index[index["id"] == pid][["day", "offset"]].tolist():
+        day = date.fromordinal(ordinal)
+        with open_day_bytes(day, directory, delta) as f:
+            header = next(csv.reader([f.readline().decode("utf-8")]))
+            f.seek(offset)
+            values = next(csv.reader([f.readline().decode("utf-8")]))
+        history.append((day, row_normaliser(header)(values)))
+    return history
+
+
+delta_keyframe_interval = 28
+"""Longest chain of deltas, so restoring a day replays at most this many."""
+
+CsvRows = List[List[str]]
+
+
+def parse_csv(text: str) -> Tuple[List[str], CsvRows]:
+    r = csv.reader(io.StringIO(text, newline=""))
+    return next(r), list(r)
+
+
+def render_csv(header: Sequence[str], rows: CsvRows, terminator: str) -> str:
+    out = io.StringIO(newline="")
+    w = csv.writer(out, lineterminator=terminator)
+    w.writerow(header)
+    w.writerows(rows)
+    return out.getvalue()
+
+
+def row_keys(header: Sequence[str], rows: CsvRows) -> List[Tuple[str, int]]:
+    """(player id, occurrence) per row, so rows with a duplicated id still match up day to day."""
+    id_column = header.index("id")
+    seen: Dict[str, int] = {}
+    keys = []
+    for row in rows:
+        pid = row[id_column]
+        seen[pid] = seen.get(pid, 0) + 1
+        keys.append((pid, seen[pid]))
+    return keys
+
+
+def diff_rows(header: Sequence[str], base: CsvRows, rows: CsvRows) -> List[Any]:
+    """Encode rows against base: per row the matching base row index alone if it
+    is unchanged, [index, column, value, ...] for the fields that changed, or the
+    whole row (a list starting with the name) for a player not in base. A changed
+    value sharing a long prefix with the old one is stored as [prefix length, rest]."""
+    positions = {key: i for i, key in enumerate(row_keys(header, base))}
+    entries: List[Any] = []
+    for key, row in zip(row_keys(header, rows), rows):
+        i = positions.get(key)
+        if i is None:
+            entries.append(row)
+        elif base[i] == row:
+            entries.append(i)
+        else:
+            entry: List[Any] = [i]
+            for column, (old, new) in enumerate(zip(base[i], row)):
+                if old != new:
+                    # portraits keep their file name and only change the ?timestamp, so keep long prefixes
+                    keep = len(os.path.commonprefix([old, new]))
+                    entry += [column, [keep, new[keep:]] if keep >= 16 else new]
+            entries.append(entry)
+    return entries
+
+
+def apply_diff(base: CsvRows, entries: List[Any]) -> CsvRows:
+    rows = []
+    for entry in entries:
+        if isinstance(entry, int):
+            rows.append(base[entry])
+        elif entry and isinstance(entry[0], str):
+            rows.append(entry)
+        else:
+            row = list(base[entry[0]])
+            for column, value in zip(entry[1::2], entry[2::2]):
+                row[column] = value if isinstance(value, str) else row[column][: value[0]] + value[1]
+            rows.append(row)
+    return rows
+
+
+def delta_path(day: date, delta: str = delta_dir) -> str:
+    return os.path.join(delta, snapshot_name(day, ".json.gz"))
+
+
+def read_delta(day: date, delta: str = delta_dir) -> Dict[str, Any]:
+    with gzip.open(delta_path(day, delta), "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_delta(day: date, entry: Dict[str, Any], delta: str = delta_dir):
+    # mtime=0 keeps the bytes identical when a day is re-encoded unchanged, so git sees no change
+    data = gzip.compress(json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), mtime=0)
+    path = delta_path(day, delta)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def restore_text(day: date, delta: str = delta_dir) -> str:
+    """A day's CSV exactly as it was archived, rebuilt from its keyframe and deltas."""
+    chain = []
+    entry = read_delta(day, delta)
+    while "text" not in entry:
+        chain.append(entry)
+        entry = read_delta(date.fromisoformat(entry["base"]), delta)
+    if not chain:
+        return entry["text"]
+    _, rows = parse_csv(entry["text"])
+    for link in reversed(chain):
+        rows = apply_diff(rows, link["rows"])
+    return render_csv(chain[0]["header"], rows, chain[0]["terminator"])
+
+
+def encode_deltas(
+    directory: str = archive_dir, delta: str = delta_dir, interval: int = delta_keyframe_interval
+) -> int:
+    """Encode archived CSVs that are not in delta/ yet; returns how many were written.
+
+    The newest encoded day is always re-encoded if it has a CSV, since
+    save_rankings may have rewritten it. A day becomes a keyframe when its chain
+    would exceed interval, when its header differs from the day before, or when
+    the delta would not reproduce the CSV byte for byte. Days kept only in
+    delta/ serve as bases for the days after them.
+    """
+    os.makedirs(delta, exist_ok=True)
+    done = list_days(delta, ".json.gz")
+    todo = set(list_days(directory)) - set(done[:-1])
+    written = 0
+    previous: Optional[Tuple[date, List[str], CsvRows, int]] = None
+    days = archived_days(directory, delta)
+    for i, day in enumerate(days):
+        next_day = days[i + 1] if i + 1 < len(days) else None
+        if day not in todo and next_day not in todo:
+            previous = None  # neither this day nor the next needs its rows
+            continue
+        text = read_text(day, directory, delta)
+        header, rows = parse_csv(text)
+        if day not in todo:
+            depth = read_delta(day, delta)["depth"]
+        else:
+            entry: Dict[str, Any] = {"day": day.isoformat(), "depth": 0, "text": text}
+            if previous is not None and previous[3] + 1 < interval and previous[1] == header:
+                terminator = "\r\n" if text.endswith("\r\n") else "\n"
+                entries = diff_rows(header, previous[2], rows)
+                if render_csv(header, apply_diff(previous[2], entries), terminator) == text:
+                    entry = {
+                        "day": day.isoformat(),
+                        "base": previous[0].isoformat(),
+                        "depth": previous[3] + 1,
+                        "header": header,
+                        "terminator": terminator,
+                        "rows": entries,
+                    }
+            write_delta(day, entry, delta)
+            depth = entry["depth"]
+            written += 1
+        previous = (day, header, rows, depth)
+    return written
+
+
+def prune_csvs(
+    directory: str = archive_dir, delta: str = delta_dir, days: Optional[Iterable[date]] = None
+) -> int:
+    """Remove the CSVs of days (default all) that delta/ restores byte for byte; returns how many.
+
+    A CSV rewritten after its day was encoded no longer matches and is kept.
+    """
+    candidates = set(list_days(delta, ".json.gz")) & set(list_days(directory))
+    removed = 0
+    for day in sorted(candidates if days is None else candidates & set(days)):
+        path = os.path.join(directory, snapshot_name(day))
+        with open(path, "rb") as f:
+            if restore_text(day, delta).encode("utf-8") != f.read():
+                continue
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def cli(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="archive.py", description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="backfill columnar/ from archive/")
+    convert.add_argument("--overwrite", action="store_true", help="rewrite existing columnar files")
+    commands.add_parser("index", help="build or update the player history index")
+    history = commands.add_parser("history", help="print a player's archived rows as CSV")
+    history.add_argument("id", type=int)
+    encode = commands.add_parser("delta", help="encode new days of archive/ into delta/")
+    encode.add_argument("--prune", action="store_true", help="then remove the CSVs delta/ restores exactly")
+    restore = commands.add_parser("restore", help="print a day's CSV rebuilt from delta/")
+    restore.add_argument("day", type=date.fromisoformat)
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        print(f"converted {convert_archive(overwrite=args.overwrite)} snapshot(s)")
+    elif args.command == "index":
+        print(f"indexed {update_index()} day(s)")
+    elif args.command == "history":
+        # index/ is not committed, so bring it up to date with whatever days were pulled since
+        update_index()
+        w = csv.writer(sys.stdout)
+        w.writerow(("date",) + player_fields)
+        for day, row in player_history(args.id):
+            w.writerow((day.isoformat(),) + tuple(row.get(name, "") for name in player_fields))
+    elif args.command == "delta":
+        print(f"encoded {encode_deltas()} day(s)")
+        if args.prune:
+            print(f"removed {prune_csvs()} CSV(s) now kept only in delta/")
+    elif args.command == "restore":
+        sys.stdout.buffer.write(restore_text(args.day).encode("utf-8"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
@@ -0,0 +1,225 @@
+"""Benchmarks over the test_data fixtures and the archive. Run with `python bench.py`.
+
+Every benchmark reports one or more named results, each a value with a unit:
+rates ("/s") are better higher, times ("s") better lower. `--save` stores the
+results as the baseline (bench_baseline.json), and later runs print their change
+against it and exit 1 if any result got worse by more than the tolerance.
+Baselines are only comparable on the machine that made them.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging as logs
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import archive
+import main
+from fake_lodestone import FakeLodestone, fake_dcs, lognormal_latency, serving
+
+test_data = os.path.join(os.path.dirname(__file__), "test_data")
+baseline_file = "./bench_baseline.json"
+bench_tolerance = 0.2
+"""Fractional change against the baseline that counts as a regression."""
+
+Results = Dict[str, Dict[str, Any]]
+"""Result name -> {"value": float, "unit": str}."""
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(test_data, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def rate(fn: Callable[[], Any], seconds: float = 2.0) -> float:
+    """Call fn repeatedly for about `seconds` and return calls per second."""
+    fn()  # warm up caches (compiled regexes, imports) outside the timed loop
+    n = 0
+    t0 = time.perf_counter()
+    while (elapsed := time.perf_counter() - t0) < seconds:
+        fn()
+        n += 1
+    return n / elapsed
+
+
+def result(value: float, unit: str) -> Dict[str, Any]:
+    return {"value": value, "unit": unit}
+
+
+@contextlib.contextmanager
+def scratch_dir() -> Iterator[str]:
+    """Run from an empty temporary directory, for code that writes relative to the working directory."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            yield d
+        finally:
+            os.chdir(cwd)
+
+
+def bench_ranking_parsers(seconds: float = 2.0) -> Results:
+    """Ranking pages/sec for every parse_ranking_page backend."""
+    html = read_fixture("ranking_elemental.html")
+    return {
+        f"parse_ranking_page[{backend}]": result(rate(lambda: main.parse_ranking_page(html, backend), seconds), "pages/s")
+        for backend in main.ranking_parsers
+    }
+
+
+def bench_parse_job(seconds: float = 2.0) -> Results:
+    """Character pages/sec through Player.parse_job, for a whole page and for stream_player_job's snippet."""
+    html = FakeLodestone(dcs=["Chaos"]).character(0)  # the fixture page, with a class icon in jobicomap
+    snippet = main.class_icon_snippet(html)
+    return {
+        "parse_job_html[page]": result(rate(lambda: main.parse_job_html(html), seconds), "pages/s"),
+        "parse_job_html[snippet]": result(rate(lambda: main.parse_job_html(snippet), seconds), "pages/s"),
+    }
+
+
+def fixture_players(n: int) -> List[main.Player]:
+    """n players with distinct ids, copied from the ranking fixture's."""
+    players, _ = main.parse_ranking_page(read_fixture("ranking_elemental.html"))
+    copies = []
+    for i in range(n):
+        p = main.Player.from_dict(players[i % len(players)].as_dict())
+        p.id, p.cur_rank, p.job = 1_000_000 + i, i + 1, "PLD"
+        copies.append(p)
+    return copies
+
+
+def bench_save_rankings(seconds: float = 2.0, rows: int = 3000) -> Results:
+    """Rows/sec written by save_rankings: the archive CSV and its columnar copy."""
+    players = fixture_players(rows)
+    with scratch_dir():
+        os.makedirs(archive.archive_dir)
+        os.makedirs(archive.columnar_dir)
+        return {"save_rankings": result(rate(lambda: main.save_rankings(players), seconds) * rows, "rows/s")}
+
+
+def bench_archive_load(directory: str = archive.archive_dir) -> Results:
+    """Time to stream the whole archive with iter_archive, and to load it columnar if converted."""
+    if not archive.archived_days(directory):
+        return {}
+    t0 = time.perf_counter()
+    rows = sum(1 for _ in archive.iter_archive(directory=directory))
+    results = {
+        "iter_archive": result(time.perf_counter() - t0, "s"),
+        "iter_archive rows": result(rows / (time.perf_counter() - t0), "rows/s"),
+    }
+    if archive.list_days(archive.columnar_dir, ".npz"):
+        t0 = time.perf_counter()
+        archive.load_history(directory=directory)
+        results["load_history[columnar]"] = result(time.perf_counter() - t0, "s")
+    return results
+
+
+def bench_end_to_end(dcs: int = 4, pages: int = 2, latency: float = 0.05) -> Results:
+    """main() against fake_lodestone with log-normal latency and rate limits out of the way."""
+    server = FakeLodestone(
+        dcs=fake_dcs[:dcs], pages=pages, latency=lognormal_latency(latency, rng=random.Random(0)), seed=0
+    )
+    with scratch_dir() as d, serving(server, d, rate_scale=1000):
+        t0 = time.perf_counter()
+        ok = asyncio.run(main.main())
+        seconds = time.perf_counter() - t0
+    if not ok:
+        raise RuntimeError("main() reported issues against the fake Lodestone")
+    players = dcs * pages * server.players_per_page
+    return {
+        "main[fake]": result(seconds, "s"),
+        "main[fake] players": result(players / seconds, "players/s"),
+    }
+
+
+benchmarks: Dict[str, Callable[[float], Results]] = {
+    "ranking": bench_ranking_parsers,
+    "job": bench_parse_job,
+    "save": bench_save_rankings,
+    "archive": lambda seconds: bench_archive_load(),
+    "main": lambda seconds: bench_end_to_end(),
+}
+"""Benchmark name -> fn(seconds per rate measurement)."""
+
+
+def higher_is_better(unit: str) -> bool:
+    return unit.endswith("/s")
+
+
+def compare(baseline: Results, results: Results, tolerance: float = bench_tolerance) -> Tuple[List[str], List[str]]:
+    """Report lines for every result against the baseline, and the names of those that regressed."""
+    lines, regressions = [], []
+    for name, r in results.items():
+        line = f"{name}: {r['value']:.3f} {r['unit']}"
+        base = baseline.get(name)
+        if base is not None and base["value"] > 0:
+            change = r["value"] / base["value"] - 1
+            worse = -change if higher_is_better(r["unit"]) else change
+            line += f" ({change:+.1%} vs {base['value']:.3f})"
+            if worse > tolerance:
+                regressions.append(name)
+                line += " REGRESSION"
+        lines.append(line)
+    return lines, regressions
+
+
+def load_baseline(path: str = baseline_file) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results: Results, path: str = baseline_file):
+    """Merge results into the baseline, keeping those of benchmarks not run this time."""
+    baseline = load_baseline(path) or {"results": {}}
+    baseline["machine"] = machine()
+    baseline["results"].update(results)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=1)
+
+
+def machine() -> Dict[str, Any]:
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+
+def cli(argv: Sequence[str]) -> int:
+    parser = argparse.ArgumentParser(prog="bench.py", description=__doc__.split("\n")[0])
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, of {', '.join(benchmarks)} (default all)")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent on each rate measurement")
+    parser.add_argument("--baseline", default=baseline_file)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=bench_tolerance)
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(benchmarks)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    baseline = load_baseline(args.baseline)
+    if baseline is not None and baseline.get("machine") != machine():
+        print(f"warning: the baseline was made on {baseline.get('machine')}")
+    results: Results = {}
+    for name in args.names or benchmarks:
+        results.update(benchmarks[name](args.seconds))
+    lines, regressions = compare(baseline["results"] if baseline else {}, results, args.tolerance)
+    print("\n".join(lines))
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"saved as the baseline in {args.baseline}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logs.getLogger().setLevel(logs.WARNING)
+    sys.exit(cli(sys.argv[1:]))
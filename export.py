@@ -0,0 +1,151 @@
+"""Static JSON export of the rankings for the web frontend.
+
+public/ holds these shards, each as .json and as pre-compressed .json.gz:
+
+    leaderboard/index.json          the day exported and the pages of every data center
+    leaderboard/<dc>/<page>.json    one page of that data center's current leaderboard
+    players/<id % 1000>/<id>.json   one player's archived history, oldest day first
+
+A shard is only rewritten when its content changed, so a run touches the
+leaderboard pages that moved and the histories of that day's players.
+`python export.py` brings public/ up to date with the archive, backfilling every
+archived day the first time. public/ is not committed with the archive; the
+workflows publish it to the gh-pages branch instead.
+"""
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from archive import archive_dir, archived_days, player_fields, read_day
+
+export_dir = "./public"
+export_page_size = 100
+export_chunk_days = 60
+"""Days of history merged into the player shards at once, bounding memory while backfilling."""
+
+history_fields = ("day", "dc", "world", "cur_rank", "points", "wins", "tier", "job")
+
+
+def shard_bytes(content: Any) -> bytes:
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_shard(path: str, data: bytes) -> bool:
+    """Write path and path.gz unless path already holds data; returns whether it wrote."""
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    for target, payload in ((path, data), (path + ".gz", gzip.compress(data, mtime=0))):
+        with open(target + ".tmp", "wb") as f:
+            f.write(payload)
+        os.replace(target + ".tmp", target)
+    return True
+
+
+def read_shard(path: str) -> Optional[Any]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def player_shard_path(pid: int, out: str = export_dir) -> str:
+    return os.path.join(out, "players", f"{pid % 1000:03}", f"{pid}.json")
+
+
+def export_leaderboard(day: date, rows: List[Dict[str, Any]], out: str = export_dir) -> Dict[str, int]:
+    """Write the day's leaderboard pages per data center and remove pages that no longer exist."""
+    stats = {"written": 0, "unchanged": 0, "removed": 0}
+    by_dc: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        by_dc[row["dc"]].append(row)
+    index: Dict[str, Any] = {"day": day.isoformat(), "page_size": export_page_size, "dcs": {}}
+    root = os.path.join(out, "leaderboard")
+    for dc, players in sorted(by_dc.items()):
+        players.sort(key=lambda row: row["cur_rank"])
+        pages = [players[i : i + export_page_size] for i in range(0, len(players), export_page_size)]
+        index["dcs"][dc] = {"players": len(players), "pages": len(pages)}
+        for page, page_rows in enumerate(pages, 1):
+            content = {
+                "day": day.isoformat(),
+                "dc": dc,
+                "page": page,
+                "pages": len(pages),
+                "columns": player_fields,
+                "rows": [[row[name] for name in player_fields] for row in page_rows],
+            }
+            written = write_shard(os.path.join(root, dc, f"{page}.json"), shard_bytes(content))
+            stats["written" if written else "unchanged"] += 1
+    for dc in os.listdir(root) if os.path.isdir(root) else []:
+        if not os.path.isdir(os.path.join(root, dc)):
+            continue
+        pages = index["dcs"].get(dc, {}).get("pages", 0)
+        for name in os.listdir(os.path.join(root, dc)):
+            if int(name.split(".")[0]) > pages:
+                os.remove(os.path.join(root, dc, name))
+                stats["removed"] += name.endswith(".json")
+    written = write_shard(os.path.join(root, "index.json"), shard_bytes(index))
+    stats["written" if written else "unchanged"] += 1
+    return stats
+
+
+def export_histories(days: List[date], directory: str = archive_dir, out: str = export_dir) -> Dict[str, int]:
+    """Merge these days' rows into the player history shards, export_chunk_days at a time.
+
+    Rows replace any entry already exported for the same day, so re-exporting a
+    rewritten day is safe.
+    """
+    stats = {"written": 0, "unchanged": 0}
+    for start in range(0, len(days), export_chunk_days):
+        updates: Dict[int, Dict[str, Any]] = defaultdict(dict)
+        for day in days[start : start + export_chunk_days]:
+            for row in read_day(day, directory):
+                entry = [day.isoformat()] + [row[name] for name in history_fields[1:]]
+                updates[row["id"]][day.isoformat()] = (row["name"], entry)
+        for pid, entries in updates.items():
+            path = player_shard_path(pid, out)
+            shard = read_shard(path)
+            history = {entry[0]: entry for entry in shard["history"]} if shard else {}
+            history.update((d, entry) for d, (_, entry) in entries.items())
+            newest = max(history)
+            content = {
+                "id": pid,
+                "name": entries[newest][0] if newest in entries else shard["name"],
+                "columns": history_fields,
+                "history": [history[d] for d in sorted(history)],
+            }
+            stats["written" if write_shard(path, shard_bytes(content)) else "unchanged"] += 1
+    return stats
+
+
+def export_static(directory: str = archive_dir, out: str = export_dir, backfill: bool = True) -> Dict[str, int]:
+    """Bring public/ up to date with the archive; returns shard counts.
+
+    Player histories are extended with every day after the last exported one,
+    and that day itself, since save_rankings may have rewritten it. The
+    leaderboard is always the newest archived day. Without backfill, an out
+    that has never been exported to is left alone, as exporting the whole
+    archive takes minutes and writes tens of thousands of shards.
+    """
+    days = archived_days(directory)
+    if not days:
+        return {}
+    index = read_shard(os.path.join(out, "leaderboard", "index.json"))
+    if index is None and not backfill:
+        return {}
+    last = date.fromisoformat(index["day"]) if index else None
+    stats = export_histories([day for day in days if last is None or day >= last], directory, out)
+    for key, n in export_leaderboard(days[-1], read_day(days[-1], directory), out).items():
+        stats[key] = stats.get(key, 0) + n
+    return stats
+
+
+if __name__ == "__main__":
+    print(f"exported: {export_static()}")
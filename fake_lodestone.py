@@ -0,0 +1,249 @@
+"""A local stand-in for the Lodestone, for exercising main() end to end.
+
+FakeLodestone serves the data center list, ranking pages and character pages
+generated from the test_data fixtures through an httpx MockTransport, with
+configurable latency, injected 403/429/5xx responses and page counts. Nothing
+touches the network, so concurrency, rate limiting and retry changes can be
+measured on a laptop:
+
+    python fake_lodestone.py --dcs 4 --pages 6 --latency 0.2 --errors 429=0.02,503=0.01
+
+runs main() against it in a scratch directory and prints what the server saw.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Sequence
+
+import httpx
+
+import main
+from profiling import profile_run
+
+test_data = os.path.join(os.path.dirname(__file__), "test_data")
+fake_dcs = (
+    "Aether", "Chaos", "Crystal", "Dynamis", "Elemental", "Gaia", "Light", "Mana", "Materia", "Meteor", "Primal"
+)
+
+_character_id_re = re.compile(r"/lodestone/character/\d+/")
+_order_re = re.compile(r'(<div class="order">\s*)\d+')
+_ranking_re = re.compile(r"/lodestone/ranking/crystallineconflict/?$")
+_character_re = re.compile(r"/lodestone/character/(\d+)/?$")
+_class_icon_src_re = re.compile(r'(character__class_icon"><img src=")[^"]*')
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(test_data, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def lognormal_latency(median: float, spread: float = 0.5, rng: Optional[random.Random] = None) -> Callable[[], float]:
+    """Seconds per response, log-normally distributed around median like real page loads."""
+    rng = rng or random.Random()
+    return lambda: rng.lognormvariate(0, spread) * median if median > 0 else 0.0
+
+
+class FakeLodestone:
+    """Serves a synthetic Lodestone and counts what it was asked for.
+
+    Every data center has `pages` ranking pages of the fixture's players, each
+    with unique character ids, and every character page is the fixture page.
+    Like the fixture and the real Lodestone, ranking pages have no pager and
+    later pages are empty; pager adds a made-up "Page n of N" pager instead.
+    errors maps a status code to the fraction of responses that get it instead:
+    403 only hits character pages (a private profile), 429 and 503 carry a
+    Retry-After of retry_after seconds.
+    """
+
+    def __init__(
+        self,
+        dcs: Sequence[str] = fake_dcs,
+        pages: int = 6,
+        latency: Optional[Callable[[], float]] = None,
+        errors: Optional[Dict[int, float]] = None,
+        retry_after: float = 1.0,
+        pager: bool = False,
+        seed: Optional[int] = 0,
+    ):
+        self.dcs = list(dcs)
+        self.pages = pages
+        self.rng = random.Random(seed)
+        self.latency = latency or (lambda: 0.0)
+        self.errors = errors or {}
+        self.retry_after = retry_after
+        self.pager = pager
+        self.ranking_template = read_fixture("ranking_elemental.html")
+        self.character_page = read_fixture("player_28151111.html")
+        self.players_per_page = len(_character_id_re.findall(self.ranking_template))
+        self.job_icons = list(main.jobicomap)
+
+        self.requests: Counter = Counter()  # "dcs"/"ranking"/"character" -> requests
+        self.statuses: Counter = Counter()
+        self.bytes_sent = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def character_id(self, dc: str, page: int, i: int) -> int:
+        return (self.dcs.index(dc) + 1) * 1_000_000 + page * 1_000 + i
+
+    def data_centers_page(self) -> str:
+        links = "".join(f'<a href="/lodestone/ranking/crystallineconflict/?dcgroup={dc}">{dc}</a>' for dc in self.dcs)
+        return f"<html><body>{links}</body></html>"
+
+    def ranking_page(self, dc: str, page: int) -> str:
+        if page > self.pages:
+            return "<html><body></body></html>"
+        ids = (self.character_id(dc, page, i) for i in range(self.players_per_page))
+        html = _character_id_re.sub(lambda m: f"/lodestone/character/{next(ids)}/", self.ranking_template)
+        ranks = iter(range((page - 1) * self.players_per_page + 1, page * self.players_per_page + 1))
+        html = _order_re.sub(lambda m: f"{m.group(1)}{next(ranks)}", html)
+        html = html.replace("[Elemental]", f"[{dc}]")
+        if self.pager:
+            pager = f'<span class="btn__pager__current">Page {page} of {self.pages}</span>'
+            html = html.replace("</body>", f'<ul class="btn__pager"><li>{pager}</li></ul></body>')
+        return html
+
+    def character(self, pid: int) -> str:
+        """The fixture character page, with a class icon from jobicomap picked by id."""
+        icon = self.job_icons[pid % len(self.job_icons)]
+        return _class_icon_src_re.sub(rf"\g<1>https://img.finalfantasyxiv.com{icon}", self.character_page, count=1)
+
+    def injected_error(self, kind: str) -> Optional[httpx.Response]:
+        for status, rate in self.errors.items():
+            if status == 403 and kind != "character":
+                continue
+            if self.rng.random() < rate:
+                headers = {"Retry-After": str(self.retry_after)} if status in (429, 503) else {}
+                return httpx.Response(status, headers=headers)
+        return None
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency())
+            response = self.respond(request)
+        finally:
+            self.in_flight -= 1
+        self.statuses[response.status_code] += 1
+        return response
+
+    def body(self, text: str) -> AsyncIterator[bytes]:
+        """Stream text in chunks like a real server, so clients can stop reading early."""
+        data = text.encode("utf-8")
+
+        async def chunks():
+            for i in range(0, len(data), 16384):
+                self.bytes_sent += len(data[i : i + 16384])
+                yield data[i : i + 16384]
+
+        return chunks()
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if _ranking_re.search(path):
+            dc = request.url.params.get("dcgroup")
+            kind = "ranking" if dc else "dcs"
+        elif _character_re.search(path):
+            kind = "character"
+        else:
+            return httpx.Response(404)
+        self.requests[kind] += 1
+        error = self.injected_error(kind)
+        if error is not None:
+            return error
+        if kind == "dcs":
+            return httpx.Response(200, content=self.body(self.data_centers_page()))
+        if kind == "ranking":
+            if dc not in self.dcs:
+                return httpx.Response(404)
+            page = int(request.url.params.get("page", 1))
+            return httpx.Response(200, content=self.body(self.ranking_page(dc, page)))
+        return httpx.Response(200, content=self.body(self.character(int(_character_re.search(path).group(1)))))
+
+    def summary(self) -> str:
+        return (
+            f"requests {dict(self.requests)}, statuses {dict(self.statuses)}, "
+            f"{self.bytes_sent} bytes, peak {self.peak_in_flight} in flight"
+        )
+
+
+@contextlib.contextmanager
+def serving(server: FakeLodestone, directory: str, rate_scale: float = 1.0) -> Iterator[FakeLodestone]:
+    """Point main() at server, run from directory, with limiters rate_scale times faster.
+
+    main() writes archive/, caches and exports relative to the working directory,
+    so directory should be a scratch one.
+    """
+    cwd = os.getcwd()
+    limiters = [(limiter, limiter.rate, limiter.capacity) for limiter in (main.ranking_limiter, main.player_limiter)]
+    rate_per_slot = main.player_concurrency.rate_per_slot
+    os.makedirs(os.path.join(directory, "archive"), exist_ok=True)
+    main.client_transport = server.transport()
+    for limiter, rate, capacity in limiters:
+        limiter.rate, limiter.capacity = rate * rate_scale, capacity * rate_scale
+    main.player_concurrency.rate_per_slot = rate_per_slot * rate_scale  # set_limit rescales the player limiter
+    os.chdir(directory)
+    try:
+        yield server
+    finally:
+        os.chdir(cwd)
+        main.client_transport = None
+        for limiter, rate, capacity in limiters:
+            limiter.rate, limiter.capacity = rate, capacity
+        main.player_concurrency.rate_per_slot = rate_per_slot
+
+
+def parse_errors(value: str) -> Dict[int, float]:
+    """"429=0.02,503=0.01" -> {429: 0.02, 503: 0.01}"""
+    return {int(status): float(rate) for status, rate in (item.split("=") for item in value.split(",") if item)}
+
+
+def cli(argv: Sequence[str]) -> int:
+    parser = argparse.ArgumentParser(prog="fake_lodestone.py", description=__doc__.split("\n")[0])
+    parser.add_argument("--dcs", type=int, default=len(fake_dcs), help="number of data centers")
+    parser.add_argument("--pages", type=int, default=6, help="ranking pages per data center")
+    parser.add_argument("--latency", type=float, default=0.2, help="median response time in seconds")
+    parser.add_argument("--spread", type=float, default=0.5, help="log-normal sigma of the response time")
+    parser.add_argument("--errors", type=parse_errors, default={}, help="injected statuses, e.g. 403=0.05,429=0.01")
+    parser.add_argument("--pager", action="store_true", help="add a synthetic pager to the ranking pages")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="multiply the request rate limits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", metavar="DIR", help="profile the run like main.py --profile, into DIR")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    server = FakeLodestone(
+        dcs=fake_dcs[: args.dcs],
+        pages=args.pages,
+        latency=lognormal_latency(args.latency, args.spread, rng),
+        errors=args.errors,
+        pager=args.pager,
+        seed=args.seed,
+    )
+    profile = os.path.abspath(args.profile) if args.profile else None  # main() runs from the scratch directory
+    with tempfile.TemporaryDirectory() as d, serving(server, d, args.rate_scale):
+        t0 = time.perf_counter()
+        if profile:
+            main.parse_profile_dir = profile
+            ok = profile_run(main.main, profile)
+        else:
+            ok = asyncio.run(main.main())
+        elapsed = time.perf_counter() - t0
+    print(f"main() {'succeeded' if ok else 'reported issues'} in {elapsed:.1f}s")
+    print(f"server: {server.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
@@ -1,19 +1,54 @@
 from statistics import median
-from collections import Counter
-from typing import Any, Dict, List, Tuple
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple, Union
 from bs4 import BeautifulSoup
 import httpx
 import time
 import sys
+import argparse
+import re
 import csv
+import json
+import os
 import asyncio
+import contextlib
+import functools
+import gzip
+import io
+import hashlib
+import zlib
+import random
+import shutil
 from urllib.parse import urlparse
+from html import unescape as html_unescape
 import logging as logs
-from ratelimit import limits, sleep_and_retry
-from backoff import on_exception, expo
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from email.utils import parsedate_to_datetime
 import pytz
 import concurrent.futures
+from analytics import update_rollups
+from export import export_static
+from metrics import RunMetrics, merge_reports, metrics_dir, report_path, write_report
+from profiling import profile_dir, profile_run, profiled_call
+from archive import (
+    archive_dir,
+    archived_days,
+    columnar_dir,
+    delta_dir,
+    encode_deltas,
+    index_path,
+    normalise_portrait,
+    parse_csv,
+    player_fields,
+    player_schema,
+    prune_csvs,
+    read_day,
+    read_text,
+    snapshot_day,
+    snapshot_name,
+    update_index,
+    write_columnar,
+)
 
 logs.basicConfig(
     encoding="utf-8",
@@ -26,12 +61,27 @@ logs.basicConfig(
 async def get_data_centers(client: httpx.AsyncClient) -> List[str]:
     """Parse available data centers from the main ranking page."""
     logs.info("Fetching available data centers...")
-    r = await client.get(f"{base_url}/lodestone/ranking/crystallineconflict/")
+    t0 = time.monotonic()
+    r = await client.get(data_centers_url())
+    run_metrics.request("data_centers", time.monotonic() - t0)
+    run_metrics.response("data_centers", r)
     if r.status_code != 200:
         logs.error(f"Failed to fetch data centers page: {r.status_code}")
         raise httpx.HTTPError(str(r.status_code))
+    if capture is not None:
+        capture.write(data_centers_url(), r.text)
+    data_centers = parse_data_centers(r.text)
+    logs.info(f"Found data centers: {data_centers}")
+    return data_centers
+
+
+def data_centers_url() -> str:
+    return f"{base_url}/lodestone/ranking/crystallineconflict/"
+
 
-    soup = BeautifulSoup(r.text, "html.parser")
+def parse_data_centers(html: str) -> List[str]:
+    """Data center names in the order the ranking page links them."""
+    soup = BeautifulSoup(html, "html.parser")
     dc_links = soup.find_all("a", href=lambda x: x and "dcgroup=" in x)
 
     data_centers = []
@@ -42,10 +92,9 @@ async def get_data_centers(client: httpx.AsyncClient) -> List[str]:
             dc_name = href.split("dcgroup=")[1].split("&")[0]
             if dc_name not in data_centers:
                 data_centers.append(dc_name)
-
-    logs.info(f"Found data centers: {data_centers}")
     return data_centers
 
+
 region = "eu"  # na/eu - eu has marginally faster pageload speeds
 base_url = f"https://{region}.finalfantasyxiv.com"
 
@@ -97,6 +146,8 @@ jobicomap = {
 
 
 class Player:
+    __slots__ = player_fields
+
     name: str
     id: int
     cur_rank: int
@@ -118,6 +169,23 @@ class Player:
             "portrait: {self.portrait} id: {self.id}"
         )
 
+    def as_dict(self) -> Dict[str, Any]:
+        """Fields that have been set, in schema order."""
+        return {name: getattr(self, name) for name in player_fields if hasattr(self, name)}
+
+    def as_row(self) -> Tuple[Any, ...]:
+        """All fields in schema order, "" for any not set."""
+        return tuple(getattr(self, name, "") for name in player_fields)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Player":
+        """Build a Player from a dict such as a CSV row, converting values to their schema types."""
+        p = cls()
+        for name, type_ in player_schema:
+            if name in d:
+                setattr(p, name, type_(d[name]))
+        return p
+
     def parse_rankings(self, v: BeautifulSoup):
         """Populate rank/world/points/wins/tier/portrait fields from a ranking_set element."""
         self.name = v.h3.text
@@ -194,38 +262,490 @@ def parse_points_or_wins(s: str) -> Tuple[int, int]:
     return (int(tmp[0]), int(tmp[1]))
 
 
-@sleep_and_retry
-@on_exception(expo, httpx.HTTPError, max_tries=8)
-@limits(calls=2, period=1)
+class RateLimiter:
+    """Asyncio token bucket shared by every request to one class of endpoint.
+
+    Callers await acquire() before each request. An empty bucket suspends only the
+    caller on the event loop, so other workers and in-flight HTTP/2 streams keep
+    going. Reservations are taken synchronously, so no lock is needed.
+    """
+
+    def __init__(self, calls: int, period: float):
+        self.rate = calls / period
+        self.capacity = float(calls)
+        self.tokens = float(calls)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0  # end of the latest defer() pause
+        self.waits = 0
+        self.wait_time = 0.0  # total seconds callers spent waiting for a token
+        self.retries = 0
+        self.backoff_time = 0.0  # total seconds spent in retry backoff
+        self.errors: Counter = Counter()  # status code or exception name -> failed attempts
+
+    def reset(self):
+        """Start a new run: a full bucket, no pause and zeroed counters; the rate is kept."""
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.retries = 0
+        self.backoff_time = 0.0
+        self.errors.clear()
+
+    async def acquire(self):
+        now = time.monotonic()
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        self.tokens -= 1
+        # updated is in the future while the bucket is paused by defer()
+        start, offset = self.updated, max(0.0, -self.tokens) / self.rate
+        if start + offset <= now:
+            return
+        self.waits += 1
+        # A pause that begins while we sleep pushes our turn back by as much
+        while (delay := start + offset - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+            start = max(start, self.paused_until)
+        self.wait_time += time.monotonic() - now
+
+    def defer(self, seconds: float):
+        """Pause the whole bucket for seconds, e.g. when the server sends Retry-After.
+
+        Callers already waiting for a token wait out the pause too.
+        """
+        until = time.monotonic() + seconds
+        if until > self.updated:
+            self.tokens = min(self.tokens, 1.0)
+            self.updated = self.paused_until = until
+
+    def summary(self) -> str:
+        return (
+            f"waited {self.waits} time(s) for {self.wait_time:.1f}s, "
+            f"{self.retries} retries with {self.backoff_time:.1f}s backoff"
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "waits": self.waits,
+            "wait_time": round(self.wait_time, 3),
+            "retries": self.retries,
+            "backoff_time": round(self.backoff_time, 3),
+            "errors": dict(self.errors),
+        }
+
+
+class BadStatus(httpx.HTTPError):
+    """Unexpected response status; carries the server's Retry-After on a 429/503."""
+
+    def __init__(self, r: httpx.Response):
+        super().__init__(str(r.status_code))
+        self.status_code = r.status_code
+        self.retry_after = (
+            parse_retry_after(r.headers.get("Retry-After"))
+            if r.status_code in (429, 503)
+            else None
+        )
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as delta-seconds or as an HTTP-date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(pytz.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight requests to one endpoint class.
+
+    Every completed request grows the limit by 1/limit, so about +1 per round of
+    requests. A 429/503, any other error, or smoothed latency drifting above
+    latency_tolerance times the best seen so far halves it, at most once per
+    round. When given the endpoint's limiter, its rate is scaled along with the
+    limit, keeping the starting calls-per-slot ratio, so throughput follows
+    what the server tolerates between floor and ceiling.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        ceiling: int,
+        floor: int = 1,
+        latency_tolerance: float = 2.0,
+        min_latency: float = 0.1,
+        decrease: float = 0.5,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self.initial = initial
+        self.limit = float(initial)
+        self.ceiling = ceiling
+        self.floor = floor
+        self.latency_tolerance = latency_tolerance
+        self.min_latency = min_latency  # jitter below this is never congestion
+        self.decrease = decrease
+        self.limiter = limiter
+        self.rate_per_slot = limiter.rate / initial if limiter is not None else 0.0
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.latency: Optional[float] = None  # EWMA of request latency
+        self.best_latency = float("inf")
+        self.since_decrease = 0
+        self.decreases: Counter = Counter()  # reason -> count
+        self.peak = self.limit
+
+    def reset(self):
+        """Start a new run from the initial limit, forgetting the latencies and back-offs of the last."""
+        self.latency = None
+        self.best_latency = float("inf")
+        self.since_decrease = 0
+        self.decreases.clear()
+        self.peak = 0.0
+        self.set_limit(self.initial)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.wake()
+
+    def wake(self):
+        for _ in range(int(self.limit) - self.in_flight):
+            if not self.waiters:
+                break
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def on_success(self, latency: float):
+        self.since_decrease += 1
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        self.best_latency = min(self.best_latency, self.latency)
+        if self.latency > self.latency_tolerance * max(self.best_latency, self.min_latency):
+            self.back_off("latency")
+        else:
+            self.set_limit(self.limit + 1 / self.limit)
+
+    def on_error(self, throttled: bool):
+        self.since_decrease += 1
+        self.back_off("throttled" if throttled else "error")
+
+    def back_off(self, reason: str):
+        if self.since_decrease < self.limit:
+            return  # already backed off for this round of requests
+        self.since_decrease = 0
+        self.decreases[reason] += 1
+        self.set_limit(self.limit * self.decrease)
+
+    def set_limit(self, limit: float):
+        self.limit = min(float(self.ceiling), max(float(self.floor), limit))
+        self.peak = max(self.peak, self.limit)
+        if self.limiter is not None:
+            self.limiter.rate = self.rate_per_slot * self.limit
+        self.wake()
+
+    def summary(self) -> str:
+        return (
+            f"limit {self.limit:.1f} (peak {self.peak:.1f}, ceiling {self.ceiling}), "
+            f"decreases: {dict(self.decreases)}"
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "peak": round(self.peak, 2),
+            "ceiling": self.ceiling,
+            "decreases": dict(self.decreases),
+        }
+
+
+def throttled(
+    limiter: RateLimiter,
+    max_tries: int = 8,
+    concurrency: Optional[AdaptiveConcurrency] = None,
+    endpoint: Optional[str] = None,
+):
+    """Take a limiter token before every attempt and retry httpx.HTTPError with async exponential backoff.
+
+    A Retry-After sent with the error pauses the limiter instead, so every caller of
+    the endpoint class backs off together rather than only the one that got the 429.
+    With a concurrency controller, each attempt also holds one of its slots and
+    reports its latency or error to it; backoff sleeps don't hold a slot. Every
+    attempt's latency goes to run_metrics under endpoint (default f's name).
+    """
+
+    def decorator(f):
+        name = endpoint or f.__name__
+
+        @functools.wraps(f)
+        async def wrapper(*args, **kwargs):
+            for tries in range(1, max_tries + 1):
+                try:
+                    async with concurrency.slot() if concurrency else contextlib.nullcontext():
+                        await limiter.acquire()
+                        t0 = time.monotonic()
+                        try:
+                            result = await f(*args, **kwargs)
+                        finally:
+                            latency = time.monotonic() - t0
+                            run_metrics.request(name, latency)
+                        if concurrency is not None:
+                            concurrency.on_success(latency)
+                        return result
+                except httpx.HTTPError as e:
+                    limiter.errors[str(getattr(e, "status_code", type(e).__name__))] += 1
+                    if concurrency is not None:
+                        concurrency.on_error(getattr(e, "status_code", None) in (429, 503))
+                    if tries == max_tries:
+                        raise
+                    limiter.retries += 1
+                    retry_after = getattr(e, "retry_after", None)
+                    if retry_after is not None:
+                        logs.warning(f"{f.__name__}: {e}, retrying after {retry_after:.1f}s")
+                        limiter.backoff_time += retry_after
+                        limiter.defer(retry_after)
+                        continue
+                    # full jitter over 1, 2, 4, ... seconds, same as backoff.expo
+                    delay = random.uniform(0, 2 ** (tries - 1))
+                    logs.warning(f"{f.__name__}: {e}, backing off {delay:.1f}s")
+                    limiter.backoff_time += delay
+                    await asyncio.sleep(delay)
+
+        return wrapper
+
+    return decorator
+
+
+ranking_limiter = RateLimiter(calls=2, period=1)
+player_limiter = RateLimiter(calls=3, period=1)
+player_concurrency = AdaptiveConcurrency(initial=3, ceiling=8, limiter=player_limiter)
+"""In-flight character requests; starts at the old 3 workers / 3 calls per second."""
+
+run_metrics = RunMetrics()
+"""Metrics of the current run; main() starts a fresh one and writes it to metrics/ at the end."""
+
+
+response_cache_file = "./response_cache.json"
+response_cache_ttl = timedelta(days=30)
+"""Entries for URLs not requested for this long are dropped when the cache is saved."""
+parser_version = 1
+"""Bump whenever parse_job_html returns something else for the same page, so the
+response cache parses every character page again instead of reusing older jobs."""
+
+
+def parse_version() -> str:
+    """parser_version plus a hash of jobicomap, as a new icon changes parse_job_html's results too."""
+    return f"{parser_version}:{content_hash(json.dumps(jobicomap, sort_keys=True))}"
+
+
+class ResponseCache:
+    """Character page URL -> ETag/Last-Modified, content hash and job of the last response.
+
+    Fetchers send conditional GETs with the stored validators and return None on a
+    304. cached_parse then reuses the stored result for a 304, or for a 200 whose
+    body hashes the same as the one that was parsed, instead of parsing again.
+    Entries made by another parse_version() are ignored, validators included, so
+    a parser or jobicomap change gets full responses to parse again.
+
+    Ranking pages are not cached: their points and deltas change every day, so
+    their entries would hold every page's players and almost never be reused.
+    """
+
+    def __init__(self, entries: Dict[str, Dict[str, Any]]):
+        self.entries = entries
+        self.version = parse_version()
+        self.validators: Dict[str, Dict[str, str]] = {}  # from responses not yet parsed
+        self.not_modified = 0
+        self.unchanged = 0
+        self.parsed = 0
+
+    @classmethod
+    def load(cls, path: str = response_cache_file) -> "ResponseCache":
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return cls({})
+
+    def save(self, today: date, path: str = response_cache_file):
+        cutoff = (today - response_cache_ttl).isoformat()
+        entries = {
+            url: e for url, e in self.entries.items() if e["seen"] >= cutoff and e.get("parser") == self.version
+        }
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+    def current(self, url: str) -> Optional[Dict[str, Any]]:
+        """url's entry, if this parser version made it."""
+        e = self.entries.get(url)
+        return e if e is not None and e.get("parser") == self.version else None
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        e = self.current(url) or {}
+        headers = {}
+        if e.get("etag"):
+            headers["If-None-Match"] = e["etag"]
+        if e.get("last_modified"):
+            headers["If-Modified-Since"] = e["last_modified"]
+        return headers
+
+    def response(self, url: str, r: httpx.Response) -> bool:
+        """Note a response's validators; returns True if it was a 304 for a cached URL."""
+        if r.status_code == 304 and self.current(url) is not None:
+            self.not_modified += 1
+            return True
+        validators = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+        self.validators[url] = {k: v for k, v in validators.items() if v}
+        return False
+
+    def result(self, url: str, text: Optional[str], today: date) -> Optional[Any]:
+        """The stored parse result for url if text is None (a 304) or hashes the same as before."""
+        e = self.current(url)
+        if e is None or (text is not None and e["hash"] != content_hash(text)):
+            return None
+        if text is not None:
+            self.unchanged += 1
+            e.update(self.validators.pop(url, {}))
+        e["seen"] = today.isoformat()
+        return e["result"]
+
+    def store(self, url: str, text: str, result: Any, today: date):
+        self.parsed += 1
+        self.entries[url] = {
+            **self.validators.pop(url, {}),
+            "hash": content_hash(text),
+            "result": result,
+            "seen": today.isoformat(),
+            "parser": self.version,
+        }
+
+    def forget(self, url: str):
+        self.entries.pop(url, None)
+        self.validators.pop(url, None)
+
+    def summary(self) -> str:
+        return f"{self.not_modified} not modified, {self.unchanged} unchanged, {self.parsed} parsed"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+response_cache: Optional[ResponseCache] = None
+"""Set by cached_responses() for the duration of a run; fetchers only send conditional GETs while it is."""
+
+
+def ranking_url(dc: str, page: int) -> str:
+    return f"{base_url}/lodestone/ranking/crystallineconflict/?dcgroup={dc}&page={page}"
+
+
+def player_url(pid: int) -> str:
+    return f"{base_url}/lodestone/character/{pid}"
+
+
+def conditional_headers(url: str) -> Optional[Dict[str, str]]:
+    # a capture needs every body, so it never asks for a 304
+    if response_cache is None or capture is not None:
+        return None
+    return response_cache.request_headers(url)
+
+
+def not_modified(url: str, r: httpx.Response) -> bool:
+    return response_cache is not None and response_cache.response(url, r)
+
+
+@throttled(ranking_limiter, endpoint="ranking")
 async def get_ranking(client: httpx.AsyncClient, dc: str, page: int) -> str:
     """Fetch one page of the crystalline conflict ranking listing for a data center."""
-    r = await client.get(
-        f"{base_url}/lodestone/ranking/crystallineconflict/?dcgroup={dc}&page={page}"
-    )
+    r = await client.get(ranking_url(dc, page))
+    run_metrics.response("ranking", r)
     if r.status_code != 200:
         logs.error(f"get_ranking({dc},{page}): http status code: {r.status_code}")
-        raise httpx.HTTPError(str(r.status_code))
+        raise BadStatus(r)
     return r.text
 
 
-get_player_stats = []
-
-
-@sleep_and_retry
-@on_exception(expo, httpx.HTTPError, max_tries=8)
-@limits(calls=3, period=1)
-async def get_player(client: httpx.AsyncClient, pid: int) -> str:
-    """Fetch a player's Lodestone character page; returns "" on a 403 (blocked/private)."""
-    r = await client.get(f"{base_url}/lodestone/character/{pid}")
+@throttled(player_limiter, concurrency=player_concurrency, endpoint="character")
+async def get_player(client: httpx.AsyncClient, pid: int) -> Optional[str]:
+    """Fetch a player's Lodestone character page; returns "" on a 403 (blocked/private),
+    and None like get_ranking when it is not modified."""
+    url = player_url(pid)
+    r = await client.get(url, headers=conditional_headers(url))
+    run_metrics.response("character", r)
+    if not_modified(url, r):
+        return None
     if r.status_code == 403:
         return ""
     if r.status_code != 200:
         logs.error(f"get_player({pid}): http status code: {r.status_code}")
-        raise httpx.HTTPError(str(r.status_code))
-    get_player_stats.append(r.elapsed.total_seconds())
+        raise BadStatus(r)
     return r.text
 
 
+stream_player_pages = True
+"""Fetch character pages with stream_player_job instead of get_player."""
+
+class_icon_re = re.compile(
+    rb'<div[^>]*\bclass="[^"]*\bcharacter__class_icon\b[^"]*"[^>]*>\s*<img\b[^>]*>'
+)
+stream_player_bytes: List[int] = []
+"""Body bytes stream_player_job actually read, per character page."""
+
+
+@throttled(player_limiter, concurrency=player_concurrency, endpoint="character")
+async def stream_player_job(client: httpx.AsyncClient, pid: int) -> Optional[str]:
+    """Like get_player, but stop reading the character page once its class icon has arrived.
+
+    Returns just the class icon markup, which is all Player.parse_job needs, or the
+    whole page if it never shows up. The icon sits about a third of the way into a
+    ~157 KB page, so the rest is never downloaded or parsed.
+    """
+    url = player_url(pid)
+    async with client.stream("GET", url, headers=conditional_headers(url)) as r:
+        run_metrics.response("character", r)  # the body's bytes are added once read
+        if not_modified(url, r):
+            return None
+        if r.status_code == 403:
+            return ""
+        if r.status_code != 200:
+            logs.error(f"stream_player_job({pid}): http status code: {r.status_code}")
+            raise BadStatus(r)
+        buf = bytearray()
+        snippet = None
+        async for chunk in r.aiter_bytes():
+            # rescan a little of the previous chunk in case the tag straddles chunks
+            scan_from = max(0, len(buf) - 512)
+            buf += chunk
+            m = class_icon_re.search(buf, scan_from)
+            if m is not None:
+                snippet = m.group(0) + b"</div>"
+                break
+        encoding = r.encoding or "utf-8"
+    stream_player_bytes.append(len(buf))
+    run_metrics.bytes["character"] += r.num_bytes_downloaded
+    return (snippet if snippet is not None else bytes(buf)).decode(encoding, errors="replace")
+
+
 def parse_rankings(v: BeautifulSoup) -> List[Player]:
     players: List[Player] = []
     for v in v.find_all(class_="ranking_set"):
@@ -235,6 +755,485 @@ def parse_rankings(v: BeautifulSoup) -> List[Player]:
     return players
 
 
+max_ranking_pages = 6
+"""Upper bound on ranking pages per data center; Lodestone lists the top 300 (6 x 50)."""
+
+
+def page_count(current: Optional[str], hrefs: Iterable[str]) -> Optional[int]:
+    """Total page count from the pager's "Page 1 of 6" text, else the highest page= link."""
+    if current is not None:
+        m = re.search(r"(\d+)\D+(\d+)", current)
+        if m:
+            return int(m.group(2))
+    pages = [
+        int(m.group(1))
+        for href in hrefs
+        if "dcgroup=" in href and (m := re.search(r"[?&]page=(\d+)", href))
+    ]
+    return max(pages) if pages else None
+
+
+def parse_page_count(v: BeautifulSoup) -> Optional[int]:
+    """Read the total page count from a ranking page's pager, or None without one."""
+    current = v.find(class_="btn__pager__current")
+    return page_count(
+        current.text if current is not None else None,
+        (a["href"] for a in v.find_all("a", href=True)),
+    )
+
+
+class FastNode:
+    """Just enough of the bs4 Tag interface for Player.parse_rankings, read straight off the markup.
+
+    Elements are located with regexes and depth-counted close tags instead of
+    building a tree. Text and attribute values are unescaped the way
+    html.parser does, so the resulting Players match the bs4 backends.
+    """
+
+    def __init__(self, html: str, start: int, open_end: int, end: int):
+        self.html = html
+        self.start = start  # "<" of the opening tag
+        self.open_end = open_end  # just past the opening tag's ">"
+        self.end = end  # just past the closing tag, or open_end for void elements
+        self.attrs = {
+            k: html_unescape(v1 if v1 is not None else v2 if v2 is not None else v3 or "")
+            for k, v1, v2, v3 in _attr_re.findall(html, start, open_end)[1:]
+        }
+
+    @classmethod
+    def at(cls, html: str, m: re.Match) -> "FastNode":
+        name = m.group(1).lower()
+        if name in _void_tags or m.group(0).endswith("/>"):
+            return cls(html, m.start(), m.end(), m.end())
+        depth = 1
+        for t in _tag_name_re(name, True).finditer(html, m.end()):
+            depth += -1 if t.group(1) else 1
+            if depth == 0:
+                return cls(html, m.start(), m.end(), t.end())
+        return cls(html, m.start(), m.end(), len(html))
+
+    @property
+    def inner_end(self) -> int:
+        return max(self.open_end, self.html.rfind("<", self.open_end, self.end))
+
+    def __getitem__(self, key: str) -> str:
+        return self.attrs[key]
+
+    def find_all(self, class_: str) -> List["FastNode"]:
+        pattern = _class_re(class_)
+        found, pos = [], self.open_end
+        while (m := pattern.search(self.html, pos, self.inner_end)) is not None:
+            node = FastNode.at(self.html, m)
+            found.append(node)
+            pos = node.end
+        return found
+
+    def find(self, class_: str) -> Optional["FastNode"]:
+        m = _class_re(class_).search(self.html, self.open_end, self.inner_end)
+        return None if m is None else FastNode.at(self.html, m)
+
+    def _first(self, tag: str) -> Optional["FastNode"]:
+        m = _tag_name_re(tag, False).search(self.html, self.open_end, self.inner_end)
+        return None if m is None else FastNode.at(self.html, m)
+
+    @property
+    def h3(self) -> Optional["FastNode"]:
+        return self._first("h3")
+
+    @property
+    def img(self) -> Optional["FastNode"]:
+        return self._first("img")
+
+    @property
+    def text(self) -> str:
+        return html_unescape(_tag_re.sub("", self.html[self.open_end : self.inner_end]))
+
+    def prettify(self) -> str:
+        return self.html[self.start : self.end]
+
+
+_void_tags = {"area", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"}
+_attr_re = re.compile(r"""([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?""")
+_tag_re = re.compile(r"<!--.*?-->|<[^>]*>", re.S)
+
+
+@functools.lru_cache(maxsize=None)
+def _tag_name_re(name: str, closing: bool) -> re.Pattern:
+    if closing:
+        # opening and closing tags; group 1 is "/" for the latter
+        return re.compile(rf"<(/?){name}\b[^>]*>", re.I)
+    return re.compile(rf"<({name})\b[^>]*>", re.I)
+
+
+@functools.lru_cache(maxsize=None)
+def _class_re(class_: str) -> re.Pattern:
+    return re.compile(
+        rf"""<([a-zA-Z][\w-]*)\s[^>]*?\bclass="(?:[^"]*\s)?{re.escape(class_)}(?:\s[^"]*)?"[^>]*>"""
+    )
+
+
+def _parse_ranking_soup(html: str) -> Tuple[List[Player], Optional[int]]:
+    soup = BeautifulSoup(html, "html.parser")
+    return parse_rankings(soup), parse_page_count(soup)
+
+
+def _parse_ranking_fast(html: str) -> Tuple[List[Player], Optional[int]]:
+    root = FastNode(html, 0, 0, len(html))
+    players: List[Player] = []
+    for v in root.find_all(class_="ranking_set"):
+        p = Player()
+        p.parse_rankings(v)
+        players.append(p)
+    current = root.find(class_="btn__pager__current")
+    hrefs = (html_unescape(m.group(1)) for m in re.finditer(r'<a\s[^>]*?\bhref="([^"]*page=[^"]*)"', html))
+    return players, page_count(current.text if current is not None else None, hrefs)
+
+
+ranking_parsers: Dict[str, Callable[[str], Tuple[List[Player], Optional[int]]]] = {
+    "soup": _parse_ranking_soup,  # full html.parser tree of the whole page
+    "fast": _parse_ranking_fast,  # regex extraction, no tree
+}
+ranking_parser = "fast"
+
+
+def parse_ranking_page(html: str, backend: Optional[str] = None) -> Tuple[List[Player], Optional[int]]:
+    """Parse a ranking page into its players and its pager's page count (None without a pager)."""
+    return ranking_parsers[backend or ranking_parser](html)
+
+
+def parse_ranking_records(html: str) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """parse_ranking_page with players as Player.as_dict records, cheap to send back from a parse process."""
+    players, n_pages = parse_ranking_page(html)
+    return [p.as_dict() for p in players], n_pages
+
+
+def parse_job_html(html: str) -> Tuple[str, bool]:
+    """Player.parse_job over a character page (or class icon snippet), as a plain (job, unmapped) record."""
+    p = Player()
+    unmapped = p.parse_job(BeautifulSoup(html, "html.parser"))
+    return p.job, unmapped
+
+
+parse_pool_kind = "process"  # process/thread/none - where CPU-bound parsing runs
+parse_pool_size: Optional[int] = None  # defaults to the number of cores
+parse_executor: Optional[concurrent.futures.Executor] = None
+"""Pool that run_parse dispatches to; set by parse_pool() for the duration of a run."""
+parse_profile_dir: Optional[str] = None
+"""Set by --profile: parse calls on a process pool are profiled into this directory."""
+
+
+@contextlib.asynccontextmanager
+async def parse_pool():
+    global parse_executor
+    if parse_pool_kind == "process":
+        parse_executor = concurrent.futures.ProcessPoolExecutor(parse_pool_size)
+    elif parse_pool_kind == "thread":
+        parse_executor = concurrent.futures.ThreadPoolExecutor(parse_pool_size)
+    try:
+        yield parse_executor
+    finally:
+        if parse_executor is not None:
+            parse_executor.shutdown(cancel_futures=True)
+        parse_executor = None
+
+
+async def run_parse(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a module-level parse function on the parse pool, or inline when there is none.
+
+    Only the raw HTML goes in and plain records come out, so the event loop keeps
+    fetching while pages are parsed on other cores.
+    """
+    if parse_executor is None:
+        return fn(*args)
+    if parse_profile_dir is not None and isinstance(parse_executor, concurrent.futures.ProcessPoolExecutor):
+        return await asyncio.get_running_loop().run_in_executor(
+            parse_executor, profiled_call, parse_profile_dir, fn, *args
+        )
+    return await asyncio.get_running_loop().run_in_executor(parse_executor, fn, *args)
+
+
+async def cached_parse(
+    url: str, text: Optional[str], fn: Callable[[str], Any], cacheable: Callable[[Any], bool] = lambda result: True
+) -> Any:
+    """run_parse(fn, text), or the response cache's result from the last time url had this content.
+
+    text is None when the fetcher got a 304. fn must return JSON-serialisable records.
+    Results cacheable rejects are not stored, and url is fetched in full next time.
+    """
+    if capture is not None and text is not None:
+        capture.write(url, text)
+    if response_cache is None:
+        return await run_parse(fn, text)
+    today = datetime.now(pytz.utc).date()
+    result = response_cache.result(url, text, today)
+    if result is None:
+        result = await run_parse(fn, text)
+        if cacheable(result):
+            response_cache.store(url, text, result, today)
+        else:
+            response_cache.forget(url)
+    return result
+
+
+use_response_cache = True
+
+
+@contextlib.asynccontextmanager
+async def cached_responses(path: str = response_cache_file, save_path: Optional[str] = None):
+    """Load the response cache for the duration of a run and save it afterwards, to save_path if given."""
+    global response_cache
+    if use_response_cache:
+        response_cache = ResponseCache.load(path)
+    try:
+        yield response_cache
+    finally:
+        if response_cache is not None:
+            response_cache.save(datetime.now(pytz.utc).date(), save_path or path)
+        response_cache = None
+
+
+capture_dir = "./captures"
+capture_responses = False
+"""Append every response body a run parses to captures/YYYY_MM_DD.jsonl.gz, for replay()."""
+
+
+class Capture:
+    """Append-only gzip JSONL of {"url", "body"} records.
+
+    Every record is its own gzip member, flushed as it is written, so a file cut
+    short by a crash still reads back up to its last complete record, and a
+    rerun on the same day simply appends.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self.bytes = 0
+        self.f = open(path, "ab")
+
+    def write(self, url: str, body: str):
+        data = gzip.compress(json.dumps({"url": url, "body": body}).encode("utf-8"))
+        self.f.write(data)
+        self.f.flush()
+        self.records += 1
+        self.bytes += len(data)
+
+    def close(self):
+        self.f.close()
+
+    @staticmethod
+    def read(path: str) -> Iterable[Tuple[str, str]]:
+        """(url, body) of every complete record, in the order they were captured."""
+        with open(path, "rb") as f:
+            while f.peek(1):
+                member = zlib.decompressobj(zlib.MAX_WBITS | 16)  # one gzip member
+                data = []
+                try:
+                    while not member.eof and (chunk := f.read(65536)):
+                        data.append(member.decompress(chunk))
+                    record = json.loads(b"".join(data)) if member.eof else None
+                except (zlib.error, ValueError):
+                    record = None
+                if record is None:
+                    logs.warning(f"{path} ends in a partial record, ignoring it")
+                    return
+                f.seek(-len(member.unused_data), os.SEEK_CUR)
+                yield record["url"], record["body"]
+
+
+capture: Optional[Capture] = None
+"""Set by captured_responses() for the duration of a run."""
+
+
+@contextlib.asynccontextmanager
+async def captured_responses(today: date, directory: str = capture_dir):
+    global capture
+    if capture_responses:
+        os.makedirs(directory, exist_ok=True)
+        capture = Capture(os.path.join(directory, today.strftime("%Y_%m_%d.jsonl.gz")))
+    try:
+        yield capture
+    finally:
+        if capture is not None:
+            capture.close()
+        capture = None
+
+
+def log_ranking_page(dc: str, page: int, players: List[Player]):
+    if players:
+        logs.info(f"dc {dc} page {page}: found {len(players)} players, first: {players[0].name} (rank {players[0].cur_rank}), last: {players[-1].name} (rank {players[-1].cur_rank})")
+    else:
+        logs.info(f"dc {dc} page {page}: found 0 players")
+
+
+checkpoint_dir = "./checkpoint"
+
+
+class Checkpoint:
+    """Append-only journal of one UTC day's parsed ranking pages and fetched jobs.
+
+    Every page and job is flushed to the journal as soon as it is known, so a rerun
+    on the same day after a crash, timeout or retry exhaustion only fetches what
+    the journal lacks. The journal is removed once the day's archive is written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pages: Dict[Tuple[str, int], Tuple[List[Dict[str, Any]], Optional[int]]] = {}
+        self.jobs: Dict[int, str] = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn final line from the interrupted run
+                    if record["type"] == "page":
+                        self.pages[record["dc"], record["page"]] = (record["players"], record["n_pages"])
+                    elif record["type"] == "job":
+                        self.jobs[record["id"]] = record["job"]
+        except FileNotFoundError:
+            pass
+        self.f = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def for_day(cls, today: date, directory: str = checkpoint_dir) -> "Checkpoint":
+        """Open today's journal, removing any left over from earlier days."""
+        os.makedirs(directory, exist_ok=True)
+        name = today.strftime("%Y_%m_%d.jsonl")
+        for stale in os.listdir(directory):
+            if stale != name:
+                os.remove(os.path.join(directory, stale))
+        checkpoint = cls(os.path.join(directory, name))
+        if checkpoint.pages or checkpoint.jobs:
+            logs.info(
+                f"resuming from {checkpoint.path}: {len(checkpoint.pages)} ranking page(s), "
+                f"{len(checkpoint.jobs)} job(s)"
+            )
+        return checkpoint
+
+    def write(self, record: Dict[str, Any]):
+        self.f.write(json.dumps(record) + "\n")
+        self.f.flush()
+
+    def ranking_page(self, dc: str, page: int) -> Optional[Tuple[List[Player], Optional[int]]]:
+        if (dc, page) not in self.pages:
+            return None
+        records, n_pages = self.pages[dc, page]
+        return [Player.from_dict(record) for record in records], n_pages
+
+    def record_page(self, dc: str, page: int, players: List[Player], n_pages: Optional[int]):
+        self.write(
+            {"type": "page", "dc": dc, "page": page, "players": [p.as_dict() for p in players], "n_pages": n_pages}
+        )
+
+    def resolve(self, p: Player) -> bool:
+        """Set p.job from an earlier attempt today and return True, if there was one."""
+        if p.id not in self.jobs:
+            return False
+        p.job = self.jobs[p.id]
+        return True
+
+    def record_job(self, p: Player):
+        self.write({"type": "job", "id": p.id, "job": p.job})
+
+    def close(self):
+        self.f.close()
+
+    def finish(self):
+        """Drop the journal once its day has been archived."""
+        self.close()
+        os.remove(self.path)
+
+
+OnPage = Optional[Callable[[str, int, List[Player]], Awaitable[None]]]
+"""Awaited with (dc, page, players) for every ranking page as soon as it is parsed."""
+
+
+async def get_ranking_page(
+    client: httpx.AsyncClient,
+    dc: str,
+    page: int,
+    checkpoint: Optional[Checkpoint] = None,
+) -> Tuple[List[Player], Optional[int]]:
+    resumed = checkpoint.ranking_page(dc, page) if checkpoint is not None else None
+    if resumed is not None:
+        players, n_pages = resumed
+    else:
+        html = await get_ranking(client, dc, page)
+        if capture is not None:
+            capture.write(ranking_url(dc, page), html)
+        records, n_pages = await run_parse(parse_ranking_records, html)
+        players = [Player.from_dict(record) for record in records]
+        if checkpoint is not None:
+            checkpoint.record_page(dc, page, players, n_pages)
+    log_ranking_page(dc, page, players)
+    return players, n_pages
+
+
+async def get_dc_rankings(
+    client: httpx.AsyncClient,
+    dc: str,
+    on_page: OnPage = None,
+    checkpoint: Optional[Checkpoint] = None,
+    collect: bool = True,
+) -> List[Player]:
+    """Fetch every ranking page of a data center, in rank order.
+
+    Lodestone's ranking pages have no pager, so pages 1 to max_ranking_pages are
+    fetched concurrently and the data center ends at the first page that is
+    empty, shorter than page 1 or a repeat of players already listed; the pages
+    after it are dropped. A pager on page 1, where there is one, cancels the
+    pages past its count instead. on_page is awaited with each page's players in
+    page order, as soon as that page and every one before it are parsed.
+    Pages already in the checkpoint are taken from it instead of fetched. Without
+    collect, players are only handed to on_page and an empty list is returned.
+    """
+    last = max_ranking_pages
+    resumed = checkpoint.ranking_page(dc, 1) if checkpoint is not None else None
+    if resumed is not None and resumed[1] is not None:
+        last = min(resumed[1], max_ranking_pages)
+    tasks = {
+        page: asyncio.ensure_future(get_ranking_page(client, dc, page, checkpoint=checkpoint))
+        for page in range(1, last + 1)
+    }
+    collected: List[Player] = []
+    seen = set()
+    counts: List[int] = []  # players per page, in page order
+    try:
+        page = 0
+        while page < last:
+            page += 1
+            players, n_pages = await tasks[page]
+            if page == 1 and n_pages is not None:
+                if n_pages > max_ranking_pages:
+                    logs.warning(f"dc {dc} has {n_pages} ranking pages, only fetching the first {max_ranking_pages}")
+                last = min(n_pages, max_ranking_pages)
+                for later in range(last + 1, len(tasks) + 1):
+                    tasks[later].cancel()
+            if not players:
+                logs.info(f"no players found on page {page} for dc {dc}, stopping pagination")
+                break
+            if any(p.id in seen for p in players):
+                logs.warning(f"page {page} for dc {dc} repeats players of earlier pages, stopping pagination")
+                break
+            seen.update(p.id for p in players)
+            counts.append(len(players))
+            if on_page is not None:
+                await on_page(dc, page, players)
+            if collect:
+                collected.extend(players)
+            if len(players) < counts[0]:
+                break
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    logs.info(f"parsed rankings for {dc}: {len(counts)} page(s), total {sum(counts)} players")
+    return collected
+
+
 def check_duplicate_player_ids(players: List[Player]) -> Dict[int, int]:
     """Return a mapping of player id -> count, for ids that appear more than once."""
     id_counts = Counter(p.id for p in players)
@@ -250,148 +1249,560 @@ unmapped_job_icons: List[int] = []
 """IDs of players whose character page loaded but had a job icon missing from jobicomap - a real mapping gap, as opposed to a private profile that never loaded a page."""
 
 
+def write_rankings_csv(path: str, players: List[Player]) -> List[Tuple[Any, ...]]:
+    """Write players as an archive CSV, replacing path only once it is complete; returns the rows written."""
+    rows = [p.as_row() for p in players]
+    with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(player_fields)
+        w.writerows(rows)
+    os.replace(path + ".tmp", path)
+    return rows
+
+
+class RankingsWriter:
+    """Writes an archive CSV while the run is still going, holding only unfinished players.
+
+    Every ranking page is registered with add_page as soon as it is parsed, and
+    each of its players is passed to finish once its job is known. Players are
+    written in (data center, page, position) order, as save_rankings would, to
+    one part file per data center next to the CSV: a finished player is written
+    as soon as everything before it in its data center is, and only players
+    still waiting on an earlier one are kept. close() concatenates the parts
+    under the header and moves the result into place, so the CSV only ever
+    appears complete.
+    """
+
+    def __init__(self, path: str, dcs: List[str]):
+        self.path = path
+        self.parts = path + ".parts"
+        shutil.rmtree(self.parts, ignore_errors=True)  # left by an interrupted run
+        os.makedirs(self.parts)
+        self.dcs = dcs
+        self.files = {dc: open(self.part_path(dc), "w", encoding="utf-8", newline="") for dc in dcs}
+        self.writers = {dc: csv.writer(f) for dc, f in self.files.items()}
+        self.pages: Dict[str, Dict[int, List[Optional[Player]]]] = {dc: {} for dc in dcs}
+        self.cursor = {dc: (1, 0) for dc in dcs}  # next (page, position) to write
+        self.unfinished: Dict[int, str] = {}  # id() -> data center of registered players not finished yet
+        self.rows = 0
+
+    def part_path(self, dc: str) -> str:
+        return os.path.join(self.parts, f"{self.dcs.index(dc):03}.csv")
+
+    def add_page(self, dc: str, page: int, players: List[Player]):
+        self.pages[dc][page] = list(players)
+        self.unfinished.update((id(p), dc) for p in players)
+        self.flush(dc)  # an empty page ends the data center
+
+    def finish(self, p: Player):
+        dc = self.unfinished.pop(id(p), None)
+        if dc is not None:
+            self.flush(dc)
+
+    def flush(self, dc: str):
+        pages = self.pages[dc]
+        page, i = self.cursor[dc]
+        while page in pages:
+            slots = pages[page]
+            while i < len(slots) and id(slots[i]) not in self.unfinished:
+                self.writers[dc].writerow(slots[i].as_row())
+                slots[i] = None
+                self.rows += 1
+                i += 1
+            if i < len(slots):
+                break
+            del pages[page]
+            page, i = page + 1, 0
+        self.cursor[dc] = (page, i)
+
+    def held(self) -> int:
+        """Players registered but not written yet."""
+        return sum(len(slots) for pages in self.pages.values() for slots in pages.values()) - sum(
+            i for _, i in self.cursor.values()
+        )
+
+    def discard(self):
+        for f in self.files.values():
+            f.close()
+        shutil.rmtree(self.parts)
+
+    def close(self) -> int:
+        """Move the finished CSV into place; returns its number of rows."""
+        if self.unfinished or any(self.pages.values()):
+            raise RuntimeError(f"{self.held()} player(s) of {self.path} were never finished")
+        with open(self.path + ".tmp", "w", encoding="utf-8", newline="") as out:
+            csv.writer(out).writerow(player_fields)
+            for dc in self.dcs:
+                self.files[dc].close()
+                with open(self.part_path(dc), encoding="utf-8", newline="") as part:
+                    shutil.copyfileobj(part, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        shutil.rmtree(self.parts)
+        return self.rows
+
+
 def save_rankings(players: List[Player]):
-    """Write all players to archive/YYYY_MM_DD.csv (UTC date), one row per player."""
-    filename = "./archive/" + datetime.now(pytz.utc).strftime("%Y_%m_%d.csv")
-    with open(filename, "w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, vars(players[0]).keys())
-        w.writeheader()
-        for player in players:
-            w.writerow(vars(player))
+    """Write all players to archive/YYYY_MM_DD.csv (UTC date), one row per player,
+    and derive the day's other copies with saved_rankings."""
+    today = datetime.now(pytz.utc).date()
+    rows = write_rankings_csv(os.path.join(archive_dir, snapshot_name(today)), players)
+    saved_rankings(today, rows)
+
+
+def saved_rankings(day: date, rows: Optional[List[Tuple[Any, ...]]] = None):
+    """Index a freshly saved day if a local player history index has been built,
+    encode it into delta/ in place of its CSV if delta/ is in use, and add it to
+    the local columnar cache if there is one.
+
+    rows defaults to reading the day back, for a CSV written by RankingsWriter.
+    """
+    if os.path.exists(index_path):
+        update_index()
+    if os.path.isdir(delta_dir):
+        encode_deltas()
+        prune_csvs(days=[day])
+    # after the delta, so the columnar file isn't older than the day it was built from
+    if os.path.isdir(columnar_dir):
+        write_columnar(day, rows if rows is not None else parse_csv(read_text(day))[1])
+
+
+use_job_cache = False
+"""Reuse cached jobs instead of fetching every character page (--job-cache). Off by default:
+the job on a character page is whatever class the player last had out, and in the archive
+about a third of players with a known job show a different one from one day to the next,
+with the same portrait file and tier and whether or not they played. No field of the
+rankings predicts the change, so every cache hit risks archiving a stale job."""
+
+job_cache_file = "./job_cache.json"
+job_cache_ttl = timedelta(days=7)
+job_cache_refresh_fraction = 0.05
+"""Fraction of otherwise fresh cache hits refetched anyway each run, to catch silent job changes."""
+
+
+def portrait_file(portrait: str) -> str:
+    """A portrait without its ?timestamp query, which Lodestone bumps every day for every player."""
+    return normalise_portrait(portrait.split("?", 1)[0])
+
+
+class JobCache:
+    """Player id -> last fetched job, with the portrait and tier seen when it was fetched.
+
+    A cached job is reused unless it is older than job_cache_ttl, the player's
+    portrait file or tier changed since, it was UNK, or the player drew a forced
+    refresh. See use_job_cache for why it is only used on request.
+    """
+
+    def __init__(self, entries: Dict[int, Dict[str, str]]):
+        self.entries = entries
+        self.hits = 0
+        self.misses: Counter = Counter()  # reason -> count
+
+    @classmethod
+    def load(cls, path: str = job_cache_file, archive_dir: str = "./archive") -> "JobCache":
+        """Load the cache file, or seed it from the newest archive CSV if there is none yet."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls({int(pid): e for pid, e in json.load(f).items()})
+        except FileNotFoundError:
+            pass
+        days = archived_days(archive_dir)
+        if not days:
+            return cls({})
+        logs.info(f"seeding job cache from {snapshot_name(days[-1])}")
+        return cls(
+            {
+                row["id"]: {
+                    "job": row["job"],
+                    "portrait": row["portrait"],
+                    "tier": row["tier"],
+                    "fetched": days[-1].isoformat(),
+                }
+                for row in read_day(days[-1], archive_dir)
+            }
+        )
+
+    def resolve(self, p: Player, today: date) -> bool:
+        """Set p.job from the cache and return True, or return False if it must be fetched."""
+        e = self.entries.get(p.id)
+        if e is None:
+            reason = "new"
+        elif e["job"] == "UNK":
+            reason = "unknown"
+        elif today - date.fromisoformat(e["fetched"]) >= job_cache_ttl:
+            reason = "expired"
+        elif portrait_file(e["portrait"]) != portrait_file(p.portrait):
+            reason = "portrait"
+        elif e["tier"] != p.tier:
+            reason = "tier"
+        elif random.random() < job_cache_refresh_fraction:
+            reason = "refresh"
+        else:
+            self.hits += 1
+            p.job = e["job"]
+            return True
+        self.misses[reason] += 1
+        return False
+
+    def store(self, p: Player, today: date):
+        self.entries[p.id] = {
+            "job": p.job,
+            "portrait": p.portrait,
+            "tier": p.tier,
+            "fetched": today.isoformat(),
+        }
+
+    def save(self, today: date, path: str = job_cache_file):
+        """Write the cache, dropping entries too old to ever be a hit again."""
+        fresh = {
+            pid: e
+            for pid, e in self.entries.items()
+            if today - date.fromisoformat(e["fetched"]) < job_cache_ttl
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({str(pid): e for pid, e in sorted(fresh.items())}, f, indent=0)
+
+    def summary(self) -> str:
+        total = self.hits + sum(self.misses.values())
+        rate = self.hits / total * 100 if total else 0
+        return f"{self.hits}/{total} hits ({rate:.1f}%), misses: {dict(self.misses)}"
 
 
 async def worker(
-    name: str, queue: asyncio.Queue, client: httpx.AsyncClient, n_players: int
+    name: str,
+    queue: asyncio.Queue,
+    client: httpx.AsyncClient,
+    checkpoint: Optional[Checkpoint] = None,
+    on_done: Optional[Callable[[Player], None]] = None,
 ):
-    """Pull players off the queue and fetch/parse their job in parallel until cancelled."""
+    """Pull players off the queue and fetch/parse their job in parallel until cancelled.
+
+    on_done is called with every player once its job is set, UNK if the fetch failed.
+    """
     while True:
         try:
             # Get task from queue
             i, player = await queue.get()
 
             try:
-                logs.info(
-                    f"Worker {name}: parsing player {player.name}: {player.id} "
-                    f"({i / n_players * 100:.1f}%)"
+                logs.info(f"Worker {name}: parsing player #{i} {player.name}: {player.id}")
+                fetch = stream_player_job if stream_player_pages else get_player
+                player_resp = await fetch(client, player.id)
+                # an unmapped icon is a jobicomap gap to be fixed, so it is never cached
+                player.job, unmapped = await cached_parse(
+                    player_url(player.id), player_resp, parse_job_html, cacheable=lambda job: not job[1]
                 )
-                player_resp = await get_player(client, player.id)
-                if player.parse_job(BeautifulSoup(player_resp, "html.parser")):
+                if unmapped:
                     unmapped_job_icons.append(player.id)
+                if checkpoint is not None:
+                    checkpoint.record_job(player)
+            except Exception as e:
+                # A dead worker would leave queue.join() waiting forever
+                logs.error(f"Worker {name}: giving up on player {player.id}: {e!r}")
+                player.job = "UNK"
+                failed_player_fetches.append(player.id)
             finally:
                 # Always mark task as done, even if it fails
-                queue.task_done()
+                try:
+                    if on_done is not None:
+                        on_done(player)
+                finally:
+                    queue.task_done()
         except asyncio.CancelledError:
             break
 
 
+failed_player_fetches: List[int] = []
+"""IDs of players whose character page could not be fetched even after retries."""
+
+client_transport: Optional[httpx.AsyncBaseTransport] = None
+"""Transport for main()'s client, e.g. fake_lodestone's; None uses the network."""
+
+player_queue_size = 100
+"""Bound on players waiting for a worker; a full queue pauses ranking page intake."""
+
+stream_rankings = False
+"""Write the archive CSV with RankingsWriter as players finish instead of holding every
+player until the end, so memory stays flat however many players there are."""
+
+static_export = False
+"""Update public/ for the web frontend after archiving (--export). Only days after the
+last exported one are added; the first, full export is `python export.py`."""
+
+
+def run_export() -> Dict[str, int]:
+    stats = export_static(backfill=False)
+    if not stats:
+        logs.warning("public/ has never been exported; run python export.py to backfill it first")
+    return stats
+
+
+shard_dir = "./shards"
+shard_spec: Optional[str] = None
+"""Set by --shard: scrape only the data centers the spec selects into a partial snapshot
+under shards/YYYY_MM_DD/, for merge_shards to combine into the archive."""
+
+
+def parse_shard_spec(spec: str) -> Union[Tuple[int, int], List[str]]:
+    """"k/n" -> (k, n), the kth of n shards; anything else is a comma-separated list of data centers."""
+    m = re.fullmatch(r"(\d+)/(\d+)", spec.strip())
+    if m is not None:
+        k, n = int(m.group(1)), int(m.group(2))
+        if not 1 <= k <= n:
+            raise ValueError(f"shard {spec!r}: expected k/n with 1 <= k <= n")
+        return k, n
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    if not names:
+        raise ValueError(f"shard {spec!r}: no data centers given")
+    return names
+
+
+def shard_name(spec: str) -> str:
+    """Directory name of a shard: "2/4" -> "2of4", "Chaos,Light" -> "Chaos+Light"."""
+    parsed = parse_shard_spec(spec)
+    if isinstance(parsed, tuple):
+        return f"{parsed[0]}of{parsed[1]}"
+    return "+".join(parsed)
+
+
+def select_shard(dcs: List[str], spec: str) -> List[str]:
+    """The data centers of dcs, in order, that a shard spec selects.
+
+    "k/n" takes every nth data center starting from the kth, so the runs 1/n to n/n
+    between them scrape each data center exactly once whatever Lodestone lists.
+    """
+    parsed = parse_shard_spec(spec)
+    if isinstance(parsed, tuple):
+        k, n = parsed
+        return [dc for i, dc in enumerate(dcs) if i % n == k - 1]
+    unknown = set(parsed) - set(dcs)
+    if unknown:
+        raise ValueError(f"shard {spec!r}: no such data center(s) {sorted(unknown)}, found {dcs}")
+    return [dc for dc in dcs if dc in parsed]
+
+
+def shard_path(day: date, spec: str, directory: str = shard_dir) -> str:
+    return os.path.join(directory, day.strftime("%Y_%m_%d"), shard_name(spec))
+
+
 async def main() -> bool:
     """Scrape and archive rankings. Returns False if any sanity check failed.
 
     Archiving always happens if any players were collected, even when sanity
     checks fail, so a bad run still leaves data behind for inspection - the
     caller is responsible for surfacing the failure (e.g. failing CI).
+
+    With shard_spec set, only the shard's data centers are scraped, and the
+    rankings, caches, checkpoint and metrics all go to the shard's directory
+    with a manifest for merge_shards; the archive itself is left alone.
     """
+    global run_metrics
     logs.info("parser started")
-    t0 = time.time()
-    players: List[Player] = []
+    run_metrics = RunMetrics()
+    # The fetchers keep their state in module globals; start them afresh for every run
+    for per_run in (failed_player_fetches, unmapped_job_icons, stream_player_bytes):
+        per_run.clear()
+    ranking_limiter.reset()
+    player_limiter.reset()
+    player_concurrency.reset()  # after player_limiter, as it sets that limiter's rate
+    players: List[Player] = []  # stays empty when streaming
+    counts: Counter = Counter()
     issues: List[str] = []
 
-    async with httpx.AsyncClient(http2=True) as client:
+    today = datetime.now(pytz.utc).date()
+    shard = shard_path(today, shard_spec) if shard_spec else None
+    if shard is not None:
+        os.makedirs(shard, exist_ok=True)
+    async with (
+        httpx.AsyncClient(http2=True, transport=client_transport) as client,
+        parse_pool(),
+        cached_responses(save_path=os.path.join(shard, "response_cache.json") if shard else None) as responses,
+        captured_responses(today, os.path.join(shard, "captures") if shard else capture_dir) as captured,
+    ):
         # Get available data centers dynamically
-        dcs = await get_data_centers(client)
+        with run_metrics.phase("data_centers"):
+            dcs = await get_data_centers(client)
 
         # Sanity check: ensure we found a reasonable number of data centers
         if len(dcs) < 2:
             msg = f"Only found {len(dcs)} data centers: {dcs}. Expected at least 2."
             logs.error(msg)
             issues.append(msg)
+        all_dcs = dcs
+        if shard is not None:
+            dcs = select_shard(all_dcs, shard_spec)
+            logs.info(f"shard {shard_spec}: scraping {dcs} of {all_dcs}")
 
-        # Fetch all players first
-        for dc in dcs:
-            dc_total_players = 0
-            for page in range(1, 7):
-                logs.info(f"start parsing dc {dc} page {page}")
-                dc_resp = await get_ranking(client, dc, page)
-                new_players = parse_rankings(BeautifulSoup(dc_resp, "html.parser"))
-                if new_players:
-                    logs.info(f"page {page}: found {len(new_players)} players, first: {new_players[0].name} (rank {new_players[0].cur_rank}), last: {new_players[-1].name} (rank {new_players[-1].cur_rank})")
-                else:
-                    logs.info(f"page {page}: found 0 players")
+        # Pick up whatever an interrupted run already fetched today
+        checkpoint = Checkpoint.for_day(today, os.path.join(shard, "checkpoint") if shard else checkpoint_dir)
+        job_cache = JobCache.load() if use_job_cache else JobCache({})
+        rankings_path = os.path.join(shard, "rankings.csv") if shard else os.path.join(archive_dir, snapshot_name(today))
+        writer = RankingsWriter(rankings_path, dcs) if stream_rankings else None
 
-                players.extend(new_players)
-                dc_total_players += len(new_players)
+        def done(p: Player, store: bool = True):
+            """p's job is final: cache it unless it came from the cache, and write p out when streaming."""
+            if store and use_job_cache:
+                job_cache.store(p, today)
+            counts["unknown_jobs"] += p.job == "UNK"
+            if writer is not None:
+                writer.finish(p)
 
-                if len(new_players) == 0:
-                    logs.warning(
-                        f"no players found on page {page} for dc {dc}, stopping pagination"
-                    )
-                    break
-                elif len(new_players) != 50:
-                    logs.info(
-                        f"found {len(new_players)} players on page {page} for dc {dc} (last page)"
-                    )
+        # Workers start before the rankings so character fetches overlap ranking pages.
+        # There is one per possible slot; player_concurrency decides how many are in flight.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=player_queue_size)
+        characters_started = time.perf_counter()
+        workers = [
+            asyncio.create_task(worker(f"worker-{i}", queue, client, checkpoint, done))
+            for i in range(player_concurrency.ceiling)
+        ]
 
-            logs.info(f"parsed rankings for {dc}: total {dc_total_players} players")
+        id_counts: Counter = Counter()
+        duplicate_names: Dict[int, str] = {}
+
+        async def enqueue(dc: str, page: int, page_players: List[Player]):
+            """Check each player of a freshly parsed page for duplicates and queue job cache misses."""
+            if writer is not None:
+                writer.add_page(dc, page, page_players)
+            for p in page_players:
+                counts["players"] += 1
+                id_counts[p.id] += 1
+                if id_counts[p.id] == 2:
+                    logs.error(f"Player ID {p.id} ({p.name}) seen more than once")
+                    duplicate_names[p.id] = p.name
+                if checkpoint.resolve(p):
+                    counts["resumed_jobs"] += 1
+                    done(p)
+                # Reuse cached jobs if asked to, only fetching new or stale players
+                elif use_job_cache and job_cache.resolve(p, today):
+                    done(p, store=False)
+                else:
+                    counts["character_fetches"] += 1
+                    await queue.put((counts["character_fetches"], p))
 
-        n_players = len(players)
+        # Fetch every data center's rankings concurrently, within the ranking limiter,
+        # then reassemble in (dc, rank) order unless the writer is already streaming them out
+        with run_metrics.phase("rankings"):
+            dc_rankings = await asyncio.gather(
+                *(get_dc_rankings(client, dc, enqueue, checkpoint, collect=writer is None) for dc in dcs)
+            )
+        for dc_players in dc_rankings:
+            players.extend(dc_players)
+
+        n_players = counts["players"]
         logs.info(f"Total players collected: {n_players}")
+        if use_job_cache:
+            logs.info(f"job cache: {job_cache.summary()}")
+        logs.info(f"fetching {counts['character_fetches']} character page(s)")
 
         # Check for duplicate players by ID
-        duplicates = check_duplicate_player_ids(players)
+        duplicates = {pid: count for pid, count in id_counts.items() if count > 1}
         if duplicates:
             logs.error(f"DUPLICATE PLAYERS DETECTED: {len(duplicates)} duplicate player IDs found!")
             for player_id, count in duplicates.items():
-                duplicate_player = next(p for p in players if p.id == player_id)
-                logs.error(f"Player ID {player_id} ({duplicate_player.name}) appears {count} times")
+                logs.error(f"Player ID {player_id} ({duplicate_names[player_id]}) appears {count} times")
             issues.append(f"{len(duplicates)} duplicate player ID(s) detected")
         else:
             logs.info("Data integrity check passed: no duplicate players detected")
 
-        if players:
-            # Create a queue for tasks
-            queue = asyncio.Queue()
-
-            workers = [
-                asyncio.create_task(worker(f"worker-{i}", queue, client, n_players))
-                for i in range(3)
-            ]
-
-            # Add all players to the queue
-            for i, player in enumerate(players):
-                await queue.put((i, player))
-
-            # Wait for all tasks to complete
-            await queue.join()
+        # Wait for all tasks to complete
+        await queue.join()
+        run_metrics.add_phase("characters", characters_started)
 
-            # Cancel workers
-            for w in workers:
-                w.cancel()
+        # Cancel workers
+        for w in workers:
+            w.cancel()
 
-            # Wait for workers to finish
-            await asyncio.gather(*workers, return_exceptions=True)
+        # Wait for workers to finish
+        await asyncio.gather(*workers, return_exceptions=True)
 
-            unknown_jobs = count_unknown_jobs(players)
+        if n_players and use_job_cache:
+            job_cache.save(today, os.path.join(shard, "job_cache.json") if shard else job_cache_file)
+        if n_players:
+            unknown_jobs = counts["unknown_jobs"]
             if unknown_jobs:
                 logs.info(
                     f"{unknown_jobs} player(s) have job UNK, most likely private/inaccessible profiles"
                 )
+            if failed_player_fetches:
+                msg = f"{len(failed_player_fetches)} player(s) could not be fetched: {failed_player_fetches}"
+                logs.error(msg)
+                issues.append(msg)
             if unmapped_job_icons:
                 msg = f"{len(unmapped_job_icons)} player(s) had a job icon missing from jobicomap: {unmapped_job_icons}"
                 logs.error(msg)
                 issues.append(msg)
 
-    if players:
-        save_rankings(players)
-        logs.info(f"saved {len(players)} players to archive")
+    if n_players:
+        with run_metrics.phase("save"):
+            if writer is not None:
+                writer.close()
+                rows = None
+            else:
+                rows = write_rankings_csv(rankings_path, players)
+            if shard is None:
+                saved_rankings(today, rows)
+        logs.info(f"saved {n_players} players to {rankings_path}")
+        if shard is None:
+            with run_metrics.phase("rollups"):
+                logs.info(f"rolled up {update_rollups()} day(s)")
+            if static_export:
+                with run_metrics.phase("export"):
+                    logs.info(f"static export: {run_export()}")
+        checkpoint.finish()
     else:
+        if writer is not None:
+            writer.discard()
         logs.error("No players collected, nothing to archive")
         issues.append("No players collected")
 
-    logs.info(f"parsing finished, total time taken {time.time() - t0}s")
-    if get_player_stats:
+    logs.info(f"parsing finished, total time taken {run_metrics.elapsed():.1f}s")
+    for endpoint, histogram in sorted(run_metrics.latency.items()):
+        logs.info(f"{endpoint} latency: {histogram.summary()}")
+    if stream_player_bytes:
         logs.info(
-            f"get_player_stats: {min(get_player_stats)}, {max(get_player_stats)}, {median(get_player_stats)}"
+            f"streamed {len(stream_player_bytes)} character pages, {sum(stream_player_bytes)} bytes read "
+            f"(median {median(stream_player_bytes)})"
         )
+    logs.info(f"ranking limiter: {ranking_limiter.summary()}")
+    logs.info(f"player limiter: {player_limiter.summary()}")
+    logs.info(f"player concurrency: {player_concurrency.summary()}")
+    if responses is not None:
+        logs.info(f"response cache: {responses.summary()}")
+    if captured is not None:
+        logs.info(f"captured {captured.records} response(s), {captured.bytes} bytes, to {captured.path}")
+
+    run_metrics.counters.update(
+        counts,
+        data_centers=len(dcs),
+        job_cache_hits=job_cache.hits,
+        failed_fetches=len(failed_player_fetches),
+    )
+    if responses is not None:
+        run_metrics.counters.update(
+            not_modified=responses.not_modified, unchanged=responses.unchanged, parsed=responses.parsed
+        )
+    report = run_metrics.report(
+        day=today.isoformat(),
+        ok=not issues,
+        issues=issues,
+        limiters={"ranking": ranking_limiter.as_dict(), "player": player_limiter.as_dict()},
+        concurrency={"player": player_concurrency.as_dict()},
+    )
+    logs.info(f"run metrics written to {write_report(today, report, shard or metrics_dir)}")
+    if shard is not None:
+        manifest = {
+            "day": today.isoformat(),
+            "spec": shard_spec,
+            "dcs": all_dcs,
+            "shard_dcs": dcs,
+            "players": n_players,
+            "ok": not issues,
+            "issues": issues,
+        }
+        with open(os.path.join(shard, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        logs.info(f"shard {shard_spec} written to {shard}; combine the shards with --merge")
 
     if issues:
         logs.error(f"Run completed with {len(issues)} issue(s): {issues}")
@@ -399,5 +1810,222 @@ async def main() -> bool:
     return True
 
 
+def merge_newest(entries: Dict[Any, Dict[str, Any]], other: Dict[Any, Dict[str, Any]], key: str):
+    """Copy into entries every entry of other at least as recent by entries' date field key."""
+    for k, e in other.items():
+        if k not in entries or e[key] >= entries[k][key]:
+            entries[k] = e
+
+
+def merge_shards(day: date, directory: str = shard_dir) -> bool:
+    """Combine the day's shard runs into the archive, as if one run had scraped every data center.
+
+    The shards must have found the same data centers and scraped each exactly once,
+    or nothing is archived. Players are archived in the order Lodestone lists the
+    data centers, as an unsharded run would, then checked for ids seen more than
+    once across shards. Job and response caches keep each entry's newest copy, and
+    the shards' metrics are combined into metrics/. Returns False if a shard or the
+    merge had any issues.
+    """
+    day_dir = os.path.join(directory, day.strftime("%Y_%m_%d"))
+    manifests: Dict[str, Dict[str, Any]] = {}
+    for name in sorted(os.listdir(day_dir)) if os.path.isdir(day_dir) else []:
+        try:
+            with open(os.path.join(day_dir, name, "manifest.json"), encoding="utf-8") as f:
+                manifests[name] = json.load(f)
+        except FileNotFoundError:
+            logs.warning(f"shard {name} has no manifest, its run never finished; ignoring it")
+    if not manifests:
+        logs.error(f"No finished shards in {day_dir}, nothing to merge")
+        return False
+
+    # Sanity check: the shards add up to one whole run
+    problems: List[str] = []
+    dcs = next(iter(manifests.values()))["dcs"]
+    owners: Dict[str, List[str]] = {dc: [] for dc in dcs}
+    for name, manifest in manifests.items():
+        if manifest["dcs"] != dcs:
+            problems.append(f"shard {name} found data centers {manifest['dcs']}, expected {dcs}")
+        if not manifest["players"]:
+            problems.append(f"shard {name} collected no players")
+        for dc in manifest["shard_dcs"]:
+            owners.setdefault(dc, []).append(name)
+    missing = [dc for dc, names in owners.items() if not names]
+    if missing:
+        problems.append(f"no shard scraped {missing}")
+    overlapping = {dc: names for dc, names in owners.items() if len(names) > 1}
+    if overlapping:
+        problems.append(f"data center(s) scraped by more than one shard: {overlapping}")
+    if problems:
+        for problem in problems:
+            logs.error(problem)
+        return False
+
+    issues = [f"shard {name}: {issue}" for name, manifest in manifests.items() for issue in manifest["issues"]]
+    by_dc: Dict[str, List[Player]] = {dc: [] for dc in dcs}
+    for name in manifests:
+        with open(os.path.join(day_dir, name, "rankings.csv"), encoding="utf-8", newline="") as f:
+            for record in csv.DictReader(f):
+                p = Player.from_dict(record)
+                by_dc[p.dc].append(p)
+    players = [p for dc in dcs for p in by_dc[dc]]
+    logs.info(f"merged {len(manifests)} shard(s): {len(players)} players from {len(dcs)} data centers")
+
+    # Check for duplicate players by ID, now across shards
+    duplicates = check_duplicate_player_ids(players)
+    if duplicates:
+        logs.error(f"DUPLICATE PLAYERS DETECTED: {len(duplicates)} duplicate player IDs found!")
+        for player_id, count in duplicates.items():
+            logs.error(f"Player ID {player_id} appears {count} times")
+        issues.append(f"{len(duplicates)} duplicate player ID(s) detected")
+    else:
+        logs.info("Data integrity check passed: no duplicate players detected")
+
+    rows = write_rankings_csv(os.path.join(archive_dir, snapshot_name(day)), players)
+    saved_rankings(day, rows)
+    logs.info(f"saved {len(players)} players to archive")
+    logs.info(f"rolled up {update_rollups()} day(s)")
+    if static_export:
+        logs.info(f"static export: {run_export()}")
+
+    job_cache = JobCache.load() if use_job_cache else None
+    responses = ResponseCache.load()
+    for name in manifests:
+        shard = os.path.join(day_dir, name)
+        if job_cache is not None and os.path.exists(os.path.join(shard, "job_cache.json")):
+            merge_newest(job_cache.entries, JobCache.load(os.path.join(shard, "job_cache.json")).entries, "fetched")
+        merge_newest(responses.entries, ResponseCache.load(os.path.join(shard, "response_cache.json")).entries, "seen")
+    if job_cache is not None:
+        job_cache.save(day)
+    responses.save(day)
+
+    reports = {}
+    for name in manifests:
+        try:
+            with open(report_path(day, os.path.join(day_dir, name)), encoding="utf-8") as f:
+                reports[name] = json.load(f)
+        except FileNotFoundError:
+            logs.warning(f"shard {name} has no run metrics")
+    if reports:
+        report = merge_reports(reports, day=day.isoformat(), ok=not issues, issues=issues)
+        logs.info(f"run metrics written to {write_report(day, report)}")
+
+    if issues:
+        logs.error(f"Merge completed with {len(issues)} issue(s): {issues}")
+        return False
+    return True
+
+
+replay_dir = "./replay"
+
+
+def class_icon_snippet(html: str) -> str:
+    """Cut a full character page down to its class icon, as stream_player_job returns it."""
+    m = class_icon_re.search(html.encode("utf-8"))
+    return m.group(0).decode("utf-8") + "</div>" if m is not None else html
+
+
+def replay(path: str, output: Optional[str] = None, workers: Optional[int] = None) -> List[Player]:
+    """Rerun the parse pipeline of a captured day offline and write the result as a CSV.
+
+    Ranking and character pages are parsed in parallel on a process pool. Players
+    whose character page was not captured (job cache hits on the day) keep the job
+    the archive has for them. output defaults to replay/YYYY_MM_DD.csv; copy it over
+    the archive once the differences it logs look right.
+    """
+    day = snapshot_day(path)
+    bodies: Dict[str, str] = {}
+    for url, body in Capture.read(path):
+        bodies[url] = body  # a retried or resumed fetch replaces the earlier body
+    dcs = parse_data_centers(bodies[data_centers_url()])
+    page_urls = []
+    for dc in dcs:
+        page = 1
+        while ranking_url(dc, page) in bodies:
+            page_urls.append(ranking_url(dc, page))
+            page += 1
+    character_prefix = player_url(0)[:-1]
+    job_urls = [url for url in bodies if url.startswith(character_prefix)]
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        pages = pool.map(parse_ranking_records, (bodies[url] for url in page_urls), chunksize=4)
+        jobs = pool.map(parse_job_html, (class_icon_snippet(bodies[url]) for url in job_urls), chunksize=32)
+        players = [Player.from_dict(record) for records, _ in pages for record in records]
+        parsed_jobs = {int(url[len(character_prefix) :]): job for url, job in zip(job_urls, jobs)}
+
+    archived: Dict[int, List[str]] = {}
+    if day in archived_days(archive_dir, delta_dir):
+        r = csv.reader(io.StringIO(read_text(day, archive_dir, delta_dir), newline=""))
+        header = next(r)
+        archived = {int(values[header.index("id")]): values for values in r}
+    unmapped = 0
+    for p in players:
+        if p.id in parsed_jobs:
+            p.job, missing = parsed_jobs[p.id]
+            unmapped += missing
+        else:
+            p.job = archived[p.id][header.index("job")] if p.id in archived else "UNK"
+
+    output = output or os.path.join(replay_dir, snapshot_name(day))
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    rows = write_rankings_csv(output, players)
+    changed = sum(1 for p, row in zip(players, rows) if archived.get(p.id) != [str(v) for v in row])
+    logs.info(
+        f"replayed {path}: {len(page_urls)} ranking page(s), {len(job_urls)} character page(s), "
+        f"{len(players)} players, {unmapped} unmapped job icon(s), {changed} row(s) differ from the archive; "
+        f"wrote {output}"
+    )
+    return players
+
+
 if __name__ == "__main__":
-    sys.exit(0 if asyncio.run(main()) else 1)
+    parser = argparse.ArgumentParser(description="Scrape the Crystalline Conflict rankings into archive/.")
+    parser.add_argument("--capture", action="store_true", help="also capture every response to captures/")
+    parser.add_argument("--replay", metavar="CAPTURE", help="reparse a capture offline instead of scraping")
+    parser.add_argument("--output", help="CSV written by --replay (default replay/YYYY_MM_DD.csv)")
+    parser.add_argument("--stream", action="store_true", help="write the archive CSV as players finish")
+    parser.add_argument("--job-cache", action="store_true", help="reuse cached jobs; see use_job_cache for the risk")
+    parser.add_argument("--export", action="store_true", help="also update public/ for the web frontend")
+    parser.add_argument(
+        "--shard",
+        metavar="SPEC",
+        help='scrape only some data centers into shards/ for --merge: "k/n" for the kth of n shards, '
+        'or a comma-separated list such as "Chaos,Light"',
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="?",
+        const="today",
+        metavar="DAY",
+        help="combine the shards of DAY (YYYY-MM-DD, default today UTC) into the archive instead of scraping",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=profile_dir,
+        metavar="DIR",
+        help=f"profile the run and write the reports to DIR (default {profile_dir})",
+    )
+    args = parser.parse_args()
+    if args.replay:
+        replay(args.replay, args.output)
+        sys.exit(0)
+    if args.merge:
+        day = datetime.now(pytz.utc).date() if args.merge == "today" else date.fromisoformat(args.merge)
+        sys.exit(0 if merge_shards(day) else 1)
+    if args.shard:
+        try:
+            shard_name(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        shard_spec = args.shard
+    capture_responses = capture_responses or args.capture
+    stream_rankings = stream_rankings or args.stream
+    use_job_cache = use_job_cache or args.job_cache
+    static_export = static_export or args.export
+    if args.profile:
+        parse_profile_dir = args.profile
+        ok = profile_run(main, args.profile)
+    else:
+        ok = asyncio.run(main())
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,238 @@
+"""Per-run performance metrics for main().
+
+A run's RunMetrics collects:
+
+    phases      wall-clock start offset and duration of each phase of the run
+    endpoints   per endpoint class: responses by status, bytes downloaded and a
+                latency histogram of every request attempt
+    counters    anything else worth counting, e.g. players or job cache hits
+
+and write_report stores it, with whatever else main() adds (limiter and
+concurrency counters), as metrics/YYYY_MM_DD.json next to the archive.
+`python metrics.py` lists recent runs side by side to spot throughput regressions.
+"""
+import bisect
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import httpx
+
+metrics_dir = "./metrics"
+latency_buckets = (0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+"""Upper bounds in seconds of the latency histogram buckets; a last bucket takes the rest."""
+
+
+class Histogram:
+    """Bucketed counts of observed values, plus the values for exact quantiles.
+
+    A run observes a few thousand request latencies at most, so keeping them is cheap.
+    """
+
+    def __init__(self, bounds: Sequence[float] = latency_buckets):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.values: List[float] = []
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.values.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Count, sum, min/max, p50/p90/p99 and [upper bound, count] buckets (None for the last)."""
+        n = len(self.values)
+        return {
+            "count": n,
+            "sum": round(sum(self.values), 3),
+            "min": round(min(self.values), 4) if n else None,
+            "max": round(max(self.values), 4) if n else None,
+            **{f"p{int(q * 100)}": round(self.quantile(q), 4) if n else None for q in (0.5, 0.9, 0.99)},
+            "buckets": [[bound, count] for bound, count in zip(self.bounds + (None,), self.counts)],
+        }
+
+    def summary(self) -> str:
+        if not self.values:
+            return "no requests"
+        return (
+            f"{len(self.values)} requests, p50 {self.quantile(0.5):.3f}s, p90 {self.quantile(0.9):.3f}s, "
+            f"max {max(self.values):.3f}s"
+        )
+
+
+class RunMetrics:
+    """What one run did and how long it took, per phase and per endpoint class."""
+
+    def __init__(self):
+        self.started = datetime.now(timezone.utc)
+        self.t0 = time.perf_counter()
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.bytes: Counter = Counter()
+        self.counters: Counter = Counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def add_phase(self, name: str, start: float):
+        """Record a phase that began at perf_counter() start and ends now.
+
+        Phases may overlap: character fetches run alongside the ranking pages.
+        """
+        end = time.perf_counter()
+        self.phases[name] = {"start": round(start - self.t0, 3), "seconds": round(end - start, 3)}
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, start)
+
+    def request(self, endpoint: str, seconds: float):
+        """One request attempt's latency, whatever its outcome."""
+        self.latency[endpoint].observe(seconds)
+
+    def response(self, endpoint: str, r: httpx.Response):
+        """Count a response's status and the bytes downloaded for it so far."""
+        self.statuses[endpoint][r.status_code] += 1
+        self.bytes[endpoint] += r.num_bytes_downloaded
+
+    def endpoints(self) -> Dict[str, Dict[str, Any]]:
+        names = sorted(set(self.latency) | set(self.statuses))
+        return {
+            name: {
+                "statuses": {str(status): n for status, n in sorted(self.statuses[name].items())},
+                "bytes": self.bytes[name],
+                "latency": self.latency[name].as_dict(),
+            }
+            for name in names
+        }
+
+    def report(self, **extra: Any) -> Dict[str, Any]:
+        seconds = self.elapsed()
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "seconds": round(seconds, 3),
+            "phases": self.phases,
+            "endpoints": self.endpoints(),
+            "bytes": sum(self.bytes.values()),
+            "counters": dict(self.counters),
+            **extra,
+        }
+
+
+def report_path(day: date, directory: str = metrics_dir) -> str:
+    return os.path.join(directory, day.strftime("%Y_%m_%d.json"))
+
+
+def write_report(day: date, report: Dict[str, Any], directory: str = metrics_dir) -> str:
+    """Write the day's run report, replacing the one of an earlier run that day."""
+    os.makedirs(directory, exist_ok=True)
+    path = report_path(day, directory)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _extreme(fn: Callable[[List[float]], float], *values: Optional[float]) -> Optional[float]:
+    present = [v for v in values if v is not None]
+    return fn(present) if present else None
+
+
+def merge_latency(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Two Histogram.as_dict()s as one. The quantiles are the larger of the two, an upper bound."""
+    return {
+        "count": a["count"] + b["count"],
+        "sum": round(a["sum"] + b["sum"], 3),
+        "min": _extreme(min, a["min"], b["min"]),
+        "max": _extreme(max, a["max"], b["max"]),
+        **{q: _extreme(max, a[q], b[q]) for q in ("p50", "p90", "p99")},
+        "buckets": [[bound, n + m] for (bound, n), (_, m) in zip(a["buckets"], b["buckets"])],
+    }
+
+
+def merge_reports(reports: Dict[str, Dict[str, Any]], **extra: Any) -> Dict[str, Any]:
+    """One report for a day scraped by several shard runs, from shard name -> run report.
+
+    Counters, statuses and bytes add up. The shards run side by side, so the day
+    takes as long as its slowest shard, and each phase is the longest shard's.
+    Limiter and concurrency counters are kept per shard, as "shard/name".
+    """
+    merged: Dict[str, Any] = {
+        "started": min(report["started"] for report in reports.values()),
+        "seconds": max(report["seconds"] for report in reports.values()),
+        "phases": {},
+        "endpoints": {},
+        "bytes": sum(report["bytes"] for report in reports.values()),
+        "counters": Counter(),
+        "shards": sorted(reports),
+    }
+    for shard, report in sorted(reports.items()):
+        merged["counters"].update(report["counters"])
+        for name, phase in report["phases"].items():
+            if phase["seconds"] >= merged["phases"].get(name, {"seconds": -1})["seconds"]:
+                merged["phases"][name] = phase
+        for name, endpoint in report["endpoints"].items():
+            into = merged["endpoints"].get(name)
+            if into is None:
+                merged["endpoints"][name] = {**endpoint, "statuses": dict(endpoint["statuses"])}
+                continue
+            for status, n in endpoint["statuses"].items():
+                into["statuses"][status] = into["statuses"].get(status, 0) + n
+            into["bytes"] += endpoint["bytes"]
+            into["latency"] = merge_latency(into["latency"], endpoint["latency"])
+        for key in ("limiters", "concurrency"):
+            for name, value in report.get(key, {}).items():
+                merged.setdefault(key, {})[f"{shard}/{name}"] = value
+    merged["counters"] = dict(merged["counters"])
+    merged.update(extra)
+    return merged
+
+
+def read_reports(directory: str = metrics_dir, last: int = 14) -> List[Dict[str, Any]]:
+    """The newest `last` run reports, oldest first, each with its "day" added."""
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    except FileNotFoundError:
+        return []
+    reports = []
+    for name in names[-last:]:
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            report = json.load(f)
+        report["day"] = name[: -len(".json")].replace("_", "-")
+        reports.append(report)
+    return reports
+
+
+def trend(reports: List[Dict[str, Any]]) -> str:
+    """One line per run: duration, throughput, character page latency, retries and traffic."""
+    lines = [f"{'day':<10} {'seconds':>8} {'players/s':>9} {'char p50':>8} {'char p90':>8} {'retries':>7} {'MB':>7}"]
+    for report in reports:
+        character = report["endpoints"].get("character", {}).get("latency", {})
+        players = report["counters"].get("players", 0)
+        retries = sum(limiter.get("retries", 0) for limiter in report.get("limiters", {}).values())
+        lines.append(
+            f"{report['day']:<10} {report['seconds']:>8.1f} {players / max(report['seconds'], 1e-9):>9.1f} "
+            f"{character.get('p50') or 0:>8.3f} {character.get('p90') or 0:>8.3f} {retries:>7} "
+            f"{report['bytes'] / 1e6:>7.1f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    last = int(sys.argv[1]) if len(sys.argv) > 1 else 14
+    print(trend(read_reports(last=last)))
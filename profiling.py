@@ -0,0 +1,219 @@
+"""Profiling of a whole scrape, for `python main.py --profile`.
+
+profile_run() runs main() and writes, to profile/:
+
+    loop.prof, loop.txt      cProfile of the event loop thread: fetching, scheduling, inline work
+    parse.prof, parse.txt    cProfile of the parse pool processes, merged (see profiled_call)
+    stalls.txt               where the event loop thread was whenever it went stall_seconds without
+                             getting back to the loop, as sampled stacks, heaviest first
+    memory.txt               tracemalloc peak and top allocation sites, and peak RSS
+    summary.json             the headline numbers of all of the above
+
+The .prof files load with pstats or snakeviz. Profiling and tracemalloc slow the
+run down, so compare a profiled run with other profiled runs rather than with the
+timings in metrics/.
+"""
+import asyncio
+import cProfile
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+T = TypeVar("T")
+
+profile_dir = "./profile"
+stall_seconds = 0.1
+profile_top = 40
+"""Functions listed in the .txt reports, and allocation sites in memory.txt."""
+
+_worker_profile: Optional[cProfile.Profile] = None
+
+
+def profiled_call(directory: str, fn: Callable[..., T], *args: Any) -> T:
+    """Run fn(*args) in a pool process under that process's profiler.
+
+    The process's accumulated stats are dumped to directory/parse-<pid>.prof after
+    every call, as pool processes exit without running any cleanup of ours.
+    """
+    global _worker_profile
+    if _worker_profile is None:
+        _worker_profile = cProfile.Profile()
+    _worker_profile.enable()
+    try:
+        return fn(*args)
+    finally:
+        _worker_profile.disable()
+        _worker_profile.dump_stats(os.path.join(directory, f"parse-{os.getpid()}.prof"))
+
+
+class StallSampler:
+    """Samples the event loop thread's stack while the loop is stalled.
+
+    A heartbeat task on the loop notes the time every interval. A watchdog thread
+    checks it just as often, and once the heartbeat is more than threshold late,
+    records the loop thread's current stack every interval until it catches up.
+    Samples times interval approximates the stall time spent in each stack. This
+    stands in for asyncio's debug mode, whose per-callback bookkeeping would
+    dominate the loop profile and which only names the stalled task, not the
+    code it was stuck in.
+    """
+
+    def __init__(self, threshold: float = stall_seconds):
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self.beat = time.monotonic()
+        self.stalls = 0
+        self.samples: Counter = Counter()  # stack, innermost frame last -> samples
+        self.stop = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    async def heartbeat(self):
+        loop_thread = threading.get_ident()
+        self.thread = threading.Thread(target=self.watch, args=(loop_thread,), name="stall-sampler", daemon=True)
+        self.thread.start()
+        try:
+            while True:
+                self.beat = time.monotonic()
+                await asyncio.sleep(self.interval)
+        finally:
+            self.stop.set()
+            self.thread.join()
+
+    def watch(self, loop_thread: int):
+        stalled_beat = None
+        while not self.stop.wait(self.interval):
+            beat = self.beat
+            if time.monotonic() - beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(loop_thread)
+            if frame is None:
+                continue
+            if beat != stalled_beat:
+                stalled_beat = beat
+                self.stalls += 1
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+
+    def seconds(self) -> float:
+        return sum(self.samples.values()) * self.interval
+
+    def report(self, top: int = profile_top) -> str:
+        lines = [f"{self.stalls} stall(s) over {self.threshold}s, ~{self.seconds():.2f}s stalled in total"]
+        for stack, n in self.samples.most_common(top):
+            lines.append(f"\n~{n * self.interval:.2f}s in:")
+            lines += [f"  {os.path.basename(f)}:{line} {name}" for f, line, name in stack[-12:]]
+        return "\n".join(lines) + "\n"
+
+
+def stats_report(stats: pstats.Stats, top: int = profile_top) -> str:
+    out = io.StringIO()
+    stats.stream = out
+    for key in ("cumulative", "tottime"):
+        out.write(f"=== by {key} ===\n")
+        stats.sort_stats(key).print_stats(top)
+    return out.getvalue()
+
+
+def top_functions(stats: pstats.Stats, n: int = 10) -> Dict[str, float]:
+    """"file:line(function)" -> own time in seconds, for the n functions with the most."""
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:n]
+    return {f"{os.path.basename(f)}:{line}({name})": round(tt, 4) for (f, line, name), (_, _, tt, _, _) in entries}
+
+
+def memory_report(snapshot: tracemalloc.Snapshot, peak: int, top: int = profile_top) -> str:
+    snapshot = snapshot.filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+    )
+    lines = [f"peak traced memory: {peak / 1e6:.1f} MB (event loop process only)"]
+    if resource is not None:
+        lines.append(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3:.1f} MB")
+        lines.append(f"peak RSS of a parse pool process: {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1e3:.1f} MB")
+    lines.append(f"\ntop {top} allocation sites still live at the end of the run:")
+    for stat in snapshot.statistics("lineno")[:top]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+
+def write_text(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def profile_run(run: Callable[[], Awaitable[T]], directory: str = profile_dir) -> T:
+    """asyncio.run(run()) with every profiler on, writing their reports to directory.
+
+    Reports are written even when run() raises. Parse pool processes are only
+    profiled if the caller routes their calls through profiled_call(directory, ...).
+    """
+    os.makedirs(directory, exist_ok=True)
+    for stale in glob.glob(os.path.join(directory, "parse-*.prof")):
+        os.remove(stale)
+    sampler = StallSampler()
+    profiler = cProfile.Profile()
+
+    async def runner() -> T:
+        heartbeat = asyncio.create_task(sampler.heartbeat())
+        await asyncio.sleep(0)  # start the watchdog before run() can stall the loop
+        try:
+            return await run()
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        profiler.enable()
+        return asyncio.run(runner())
+    finally:
+        profiler.disable()
+        seconds = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        summary: Dict[str, Any] = {"seconds": round(seconds, 3)}
+        profiler.dump_stats(os.path.join(directory, "loop.prof"))
+        loop_stats = pstats.Stats(profiler)
+        write_text(os.path.join(directory, "loop.txt"), stats_report(loop_stats))
+        summary["loop_top"] = top_functions(loop_stats)
+
+        parts = glob.glob(os.path.join(directory, "parse-*.prof"))
+        if parts:
+            parse_stats = pstats.Stats(*parts)
+            parse_stats.dump_stats(os.path.join(directory, "parse.prof"))
+            write_text(os.path.join(directory, "parse.txt"), stats_report(parse_stats))
+            summary["parse_seconds"] = round(parse_stats.total_tt, 3)
+            summary["parse_top"] = top_functions(parse_stats)
+            for part in parts:
+                os.remove(part)
+
+        write_text(os.path.join(directory, "stalls.txt"), sampler.report())
+        summary["stalls"] = sampler.stalls
+        summary["stall_seconds"] = round(sampler.seconds(), 3)
+
+        write_text(os.path.join(directory, "memory.txt"), memory_report(snapshot, peak))
+        summary["peak_traced_bytes"] = peak
+        if resource is not None:
+            summary["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        with open(os.path.join(directory, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=1)
+        logging.info(f"profile written to {directory}: {summary}")
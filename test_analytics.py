@@ -0,0 +1,118 @@
+import unittest
+import os
+import sys
+import tempfile
+from datetime import date
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import analytics
+from analytics import (
+    daily_summary,
+    duplicate_ids,
+    group_counts,
+    history_summaries,
+    job_share,
+    points_stats,
+    rank_movement,
+    update_rollups,
+)
+from archive import Snapshot, player_fields, snapshot_name
+from test_archive import make_rows, write_csv
+
+
+class TestDailySummary(unittest.TestCase):
+    def test_aggregates(self):
+        rows = make_rows(4)
+        rows[3] = rows[3][:5] + ("Light",) + rows[3][6:]
+        snapshot = Snapshot.from_rows(date(2026, 8, 21), player_fields, rows)
+        self.assertEqual(
+            group_counts(snapshot, ("dc", "job")),
+            {("Chaos", "PLD"): 1, ("Chaos", "WHM"): 2, ("Light", "PLD"): 1},
+        )
+        stats = points_stats(snapshot)
+        self.assertEqual(stats["Chaos"]["count"], 3)
+        self.assertEqual(stats["Chaos"]["p50"], 1999)
+        self.assertEqual(stats["Light"]["max"], 1997)
+
+    def test_rank_movement_and_duplicates(self):
+        previous = Snapshot.from_rows(date(2026, 8, 20), player_fields, make_rows(3))
+        rows = make_rows(4)
+        # 1000 and 1002 swap first and third place, and 1001 appears twice
+        rows[0], rows[2] = rows[0][:2] + (3,) + rows[0][3:], rows[2][:2] + (1,) + rows[2][3:]
+        rows.append(rows[1])
+        current = Snapshot.from_rows(date(2026, 8, 21), player_fields, rows)
+        movement = rank_movement(previous, current)
+        self.assertEqual((movement["up"], movement["down"], movement["same"]), (1, 1, 1))
+        self.assertEqual((movement["new"], movement["dropped"]), (2, 0))
+        self.assertEqual(movement["top_climbers"], [[1002, "Player 2 ☆", 2]])
+        self.assertEqual(duplicate_ids(current), {1001: 2})
+        self.assertIsNone(daily_summary(previous, None)["movement"])
+
+
+class TestHistorySummaries(unittest.TestCase):
+    def test_cached_per_day(self):
+        with tempfile.TemporaryDirectory() as d:
+            archive, columnar, cache = (os.path.join(d, name) for name in ("archive", "columnar", "cache"))
+            os.makedirs(archive)
+            for day in (date(2026, 8, 20), date(2026, 8, 21)):
+                write_csv(os.path.join(archive, snapshot_name(day)), player_fields, make_rows(4, day.day))
+            first = history_summaries(directory=archive, columnar=columnar, cache=cache)
+            self.assertEqual([s["day"] for s in first], ["2026-08-20", "2026-08-21"])
+            self.assertEqual(first[1]["movement"]["same"], 4)
+            self.assertEqual(job_share(first)["Crystal"], {"WHM": 0.5, "PLD": 0.5})
+
+            # cached days are not recomputed; a new day only computes itself
+            write_csv(os.path.join(archive, "2026_08_22.csv"), player_fields, make_rows(2, 22))
+            with mock.patch.object(analytics, "daily_summary", wraps=daily_summary) as computed:
+                again = history_summaries(directory=archive, columnar=columnar, cache=cache)
+            self.assertEqual(computed.call_count, 1)
+            self.assertEqual(again[:2], first)
+            self.assertEqual(again[2]["movement"]["dropped"], 2)
+
+
+class TestRollups(unittest.TestCase):
+    def read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_incremental_update(self):
+        with tempfile.TemporaryDirectory() as d:
+            archive, rollups = os.path.join(d, "archive"), os.path.join(d, "rollups")
+            os.makedirs(archive)
+            write_csv(os.path.join(archive, "2026_08_20.csv"), player_fields, make_rows(3, 20))
+            write_csv(os.path.join(archive, "2026_08_21.csv"), player_fields, make_rows(2, 21))
+            self.assertEqual(update_rollups(archive, rollups), 2)
+
+            # a rewrite of the last day, where 1001 takes first place and 1003 is new, plus a new day
+            rows = make_rows(4, 21)
+            rows[0], rows[1] = rows[1][:2] + (1,) + rows[1][3:], rows[0][:2] + (2,) + rows[0][3:]
+            write_csv(os.path.join(archive, "2026_08_21.csv"), player_fields, rows)
+            write_csv(os.path.join(archive, "2026_08_22.csv"), player_fields, make_rows(4, 22))
+            self.assertEqual(update_rollups(archive, rollups), 2)
+
+            self.assertEqual(
+                self.read(os.path.join(rollups, "movement.csv")).splitlines(),
+                [
+                    "day,compared_to,up,down,same,new,dropped",
+                    "2026-08-21,2026-08-20,1,1,1,1,0",
+                    "2026-08-22,2026-08-21,1,1,2,0,0",
+                ],
+            )
+            self.assertEqual(
+                self.read(os.path.join(rollups, "top_movers.csv")).splitlines()[1:3],
+                ["2026-08-21,1001,Player 1 ☆,Chaos,2,1,1", "2026-08-21,1000,Player 0 ☆,Chaos,1,2,-1"],
+            )
+            self.assertIn("2026-08-22,Crystal,PLD,2,0.5", self.read(os.path.join(rollups, "job_share.csv")))
+
+            # the same as building from scratch
+            fresh = os.path.join(d, "fresh")
+            update_rollups(archive, fresh)
+            for name in os.listdir(fresh):
+                if name.endswith(".csv"):
+                    self.assertEqual(self.read(os.path.join(rollups, name)), self.read(os.path.join(fresh, name)))
+
+
+if __name__ == "__main__":
+    unittest.main()
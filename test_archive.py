@@ -0,0 +1,237 @@
+import unittest
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from archive import (
+    Snapshot,
+    archived_days,
+    cli,
+    convert_archive,
+    encode_deltas,
+    iter_archive,
+    list_days,
+    load_history,
+    load_snapshot,
+    player_fields,
+    player_history,
+    prune_csvs,
+    read_day,
+    read_delta,
+    restore_text,
+    snapshot_name,
+    update_index,
+    write_columnar,
+)
+
+
+def make_rows(n: int, day: int = 0):
+    return [
+        (f"Player {i} ☆", 1000 + i, i + 1, 0, "Moogle", "Chaos", 2000 - i, day, f"p{i}.jpg?{day}", "Crystal", 10 + i, 1, "PLD" if i % 2 else "WHM")
+        for i in range(n)
+    ]
+
+
+def write_csv(path: str, header, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(",".join(header) + "\r\n")
+        for row in rows:
+            f.write(",".join(str(v) for v in row) + "\r\n")
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_columnar_round_trip(self):
+        """A saved columnar snapshot should load back to exactly the rows it was built from."""
+        rows = make_rows(5)
+        with tempfile.TemporaryDirectory() as d:
+            path = write_columnar(date(2026, 8, 22), rows, d)
+            self.assertEqual(os.path.basename(path), "2026_08_22.npz")
+            snapshot = Snapshot.load(path)
+        self.assertEqual(snapshot.day, date(2026, 8, 22))
+        self.assertEqual(len(snapshot), 5)
+        self.assertEqual(snapshot.rows(), rows)
+        self.assertEqual(snapshot.categories["job"], ["PLD", "WHM"])
+
+    def test_old_csv_without_deltas(self):
+        """Columns missing from an old CSV come back as zeros."""
+        header = [f for f in player_fields if not f.endswith("_delta")]
+        rows = [tuple(v for f, v in zip(player_fields, row) if not f.endswith("_delta")) for row in make_rows(3, day=7)]
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "2022_07_06.csv")
+            write_csv(path, header, rows)
+            snapshot = Snapshot.from_csv(path)
+        self.assertEqual(snapshot.columns["points_delta"].tolist(), [0, 0, 0])
+        self.assertEqual(snapshot.strings("portrait").tolist(), ["p0.jpg?7", "p1.jpg?7", "p2.jpg?7"])
+
+
+class TestConvertArchive(unittest.TestCase):
+    def test_backfill_and_fallback(self):
+        with tempfile.TemporaryDirectory() as d:
+            archive, columnar = os.path.join(d, "archive"), os.path.join(d, "columnar")
+            os.makedirs(archive)
+            for day in (date(2026, 8, 20), date(2026, 8, 21)):
+                write_csv(os.path.join(archive, snapshot_name(day)), player_fields, make_rows(4, day.day))
+
+            # without columnar files every day comes from its CSV
+            from_csv = [s.rows() for s in load_history(directory=archive, columnar=columnar)]
+
+            self.assertEqual(convert_archive(archive, columnar), 2)
+            self.assertEqual(convert_archive(archive, columnar), 0)
+            self.assertEqual(list_days(columnar, ".npz"), [date(2026, 8, 20), date(2026, 8, 21)])
+
+            history = load_history(start=date(2026, 8, 21), directory=archive, columnar=columnar)
+            self.assertEqual([s.day for s in history], [date(2026, 8, 21)])
+            self.assertEqual(
+                [s.rows() for s in load_history(directory=archive, columnar=columnar)], from_csv
+            )
+            self.assertEqual(load_snapshot(date(2026, 8, 20), archive, columnar).rows()[0][7], 20)
+
+    def test_stale_columnar_ignored(self):
+        """A CSV replaced after its columnar copy was built (e.g. by a replay) wins until convert rebuilds the copy."""
+        day = date(2026, 8, 20)
+        with tempfile.TemporaryDirectory() as d:
+            archive, columnar = os.path.join(d, "archive"), os.path.join(d, "columnar")
+            os.makedirs(archive)
+            path = os.path.join(archive, snapshot_name(day))
+            write_csv(path, player_fields, make_rows(4, day.day))
+            self.assertEqual(convert_archive(archive, columnar), 1)
+
+            write_csv(path, player_fields, make_rows(2, day.day))
+            built = os.stat(os.path.join(columnar, snapshot_name(day, ".npz"))).st_mtime
+            os.utime(path, (built + 1, built + 1))
+            self.assertEqual(len(load_snapshot(day, archive, columnar).rows()), 2)
+            self.assertEqual(convert_archive(archive, columnar), 1)
+            self.assertEqual(len(load_snapshot(day, archive, columnar).rows()), 2)
+
+
+class TestIterArchive(unittest.TestCase):
+    def test_normalised_stream(self):
+        with tempfile.TemporaryDirectory() as d:
+            header = [f for f in player_fields if not f.endswith("_delta")]
+            old = [tuple(v for f, v in zip(player_fields, row) if not f.endswith("_delta")) for row in make_rows(3, 6)]
+            old = [row[:7] + (row[7].replace(".jpg", "_96x96.jpg"),) + row[8:] for row in old]
+            write_csv(os.path.join(d, "2022_07_06.csv"), header, old)
+            rows = make_rows(3, 7)
+            rows[1] = rows[1][:5] + ("Light",) + rows[1][6:]
+            write_csv(os.path.join(d, "2022_07_07.csv"), player_fields, rows)
+            write_csv(os.path.join(d, "2022_07_08.csv"), player_fields, make_rows(3, 8))
+
+            streamed = list(iter_archive(end=date(2022, 7, 7), dcs=["Chaos"], directory=d))
+            self.assertEqual([(day.day, row["id"]) for day, row in streamed], [(6, 1000), (6, 1001), (6, 1002), (7, 1000), (7, 1002)])
+            first = streamed[0][1]
+            self.assertEqual(list(first), list(player_fields))
+            self.assertEqual((first["points"], first["points_delta"], first["portrait"]), (2000, 0, "p0.jpg?6"))
+            self.assertEqual(streamed[3][1]["points_delta"], 7)
+            self.assertEqual(list(iter_archive(end=date(2022, 7, 7), dcs=["Chaos"], directory=d, workers=2)), streamed)
+
+
+class TestPlayerHistoryIndex(unittest.TestCase):
+    def test_build_update_and_query(self):
+        with tempfile.TemporaryDirectory() as d:
+            archive, index = os.path.join(d, "archive"), os.path.join(d, "index", "players.idx")
+            os.makedirs(archive)
+            write_csv(os.path.join(archive, "2026_08_20.csv"), player_fields, make_rows(3, 20))
+            write_csv(os.path.join(archive, "2026_08_21.csv"), player_fields, make_rows(2, 21))
+            self.assertEqual(update_index(archive, index), 2)
+
+            # a new day plus a rewrite of the last indexed one, now with a quoted name
+            rows = make_rows(3, 21)
+            rows[0] = ('"Comma, Name"',) + rows[0][1:]
+            write_csv(os.path.join(archive, "2026_08_21.csv"), player_fields, rows)
+            write_csv(os.path.join(archive, "2026_08_22.csv"), player_fields, make_rows(1, 22))
+            self.assertEqual(update_index(archive, index), 2)
+            self.assertEqual(os.path.getsize(index), 7 * 16)
+
+            history = player_history(1000, archive, index)
+            self.assertEqual([day.day for day, _ in history], [20, 21, 22])
+            self.assertEqual(history[1][1]["name"], "Comma, Name")
+            self.assertEqual(history[2][1]["points_delta"], 22)
+            self.assertEqual([day.day for day, _ in player_history(1002, archive, index)], [20, 21])
+            self.assertEqual(player_history(9999, archive, index), [])
+
+    def test_history_command_indexes_new_days(self):
+        """`archive.py history` builds a missing index and picks up days archived since it was built."""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as d:
+            os.chdir(d)
+            try:
+                os.makedirs("archive")
+                write_csv(os.path.join("archive", "2026_08_20.csv"), player_fields, make_rows(2, 20))
+                for day, expected in ((None, 1), (21, 2)):
+                    if day is not None:
+                        write_csv(os.path.join("archive", f"2026_08_{day}.csv"), player_fields, make_rows(2, day))
+                    out = io.StringIO()
+                    with contextlib.redirect_stdout(out):
+                        self.assertEqual(cli(["history", "1001"]), 0)
+                    self.assertEqual(len(out.getvalue().splitlines()), 1 + expected)
+            finally:
+                os.chdir(cwd)
+
+
+class TestDeltaSnapshots(unittest.TestCase):
+    def test_exact_restore(self):
+        with tempfile.TemporaryDirectory() as d:
+            archive, delta = os.path.join(d, "archive"), os.path.join(d, "delta")
+            os.makedirs(archive)
+            # an old-format day with "\n" line endings, then days with rank swaps,
+            # a quoted name, a duplicated id, a new entrant and a dropped player
+            header = [f for f in player_fields if not f.endswith("_delta")]
+            old = [tuple(v for f, v in zip(player_fields, row) if not f.endswith("_delta")) for row in make_rows(3, 19)]
+            with open(os.path.join(archive, "2026_08_19.csv"), "w", encoding="utf-8", newline="") as f:
+                f.write("".join(",".join(map(str, row)) + "\n" for row in [header] + old))
+            days = [make_rows(3, 20), make_rows(4, 21), make_rows(3, 22), make_rows(2, 23)]
+            days[1][0], days[1][1] = days[1][1][:2] + (1,) + days[1][1][3:], days[1][0][:2] + (2,) + days[1][0][3:]
+            days[2][2] = ('"Comma, Name"',) + days[2][2][1:]
+            days[2].append(days[2][1])
+            for day, rows in zip(range(20, 24), days):
+                write_csv(os.path.join(archive, f"2026_08_{day}.csv"), player_fields, rows)
+
+            self.assertEqual(encode_deltas(archive, delta, interval=3), 5)
+            kinds = [("text" in read_delta(day, delta), read_delta(day, delta)["depth"]) for day in list_days(archive)]
+            # a keyframe for the first day, again when the header changes, then every three days
+            self.assertEqual(kinds, [(True, 0), (True, 0), (False, 1), (False, 2), (True, 0)])
+            for day in list_days(archive):
+                with open(os.path.join(archive, snapshot_name(day)), "rb") as f:
+                    self.assertEqual(restore_text(day, delta).encode("utf-8"), f.read())
+
+            # only the newest day is re-encoded; a CSV-less day loads from its delta
+            self.assertEqual(encode_deltas(archive, delta, interval=3), 1)
+            os.remove(os.path.join(archive, "2026_08_22.csv"))
+            snapshot = load_snapshot(date(2026, 8, 22), archive, os.path.join(d, "columnar"), delta)
+            self.assertEqual(snapshot.strings("name").tolist()[2:], ["Comma, Name", "Player 1 ☆"])
+
+    def test_delta_only_archive(self):
+        """With the CSVs pruned, every reader gets the same rows from delta/ and new days still encode."""
+        with tempfile.TemporaryDirectory() as d:
+            archive, delta, index = (os.path.join(d, name) for name in ("archive", "delta", "players.idx"))
+            os.makedirs(archive)
+            for day in (20, 21, 22):
+                write_csv(os.path.join(archive, f"2026_08_{day}.csv"), player_fields, make_rows(3, day))
+            streamed = list(iter_archive(directory=archive, delta=delta))
+            self.assertEqual(encode_deltas(archive, delta), 3)
+            self.assertEqual(prune_csvs(archive, delta), 3)
+            self.assertEqual(os.listdir(archive), [])
+
+            self.assertEqual([day.day for day in archived_days(archive, delta)], [20, 21, 22])
+            self.assertEqual(list(iter_archive(directory=archive, delta=delta)), streamed)
+            self.assertEqual(update_index(archive, index, delta), 3)
+            self.assertEqual([row["points_delta"] for _, row in player_history(1001, archive, index, delta)], [20, 21, 22])
+
+            # the next day is encoded against the pruned one before it, then pruned in turn
+            write_csv(os.path.join(archive, "2026_08_23.csv"), player_fields, make_rows(4, 23))
+            with open(os.path.join(archive, "2026_08_23.csv"), "rb") as f:
+                text = f.read()
+            self.assertEqual(encode_deltas(archive, delta), 1)
+            self.assertNotIn("text", read_delta(date(2026, 8, 23), delta))
+            self.assertEqual(prune_csvs(archive, delta, days=[date(2026, 8, 23)]), 1)
+            self.assertEqual(restore_text(date(2026, 8, 23), delta).encode("utf-8"), text)
+            self.assertEqual(len(read_day(date(2026, 8, 23), archive, delta=delta)), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
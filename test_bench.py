@@ -0,0 +1,47 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench import bench_save_rankings, compare, fixture_players, load_baseline, result, save_baseline
+
+
+class TestBaseline(unittest.TestCase):
+    def test_compare(self):
+        baseline = {
+            "parse": result(100.0, "pages/s"),
+            "load": result(10.0, "s"),
+            "save": result(1000.0, "rows/s"),
+        }
+        results = {
+            "parse": result(70.0, "pages/s"),  # slower rate
+            "load": result(13.0, "s"),  # slower time
+            "save": result(1100.0, "rows/s"),  # faster
+            "new": result(1.0, "s"),  # not in the baseline
+        }
+        lines, regressions = compare(baseline, results, tolerance=0.2)
+        self.assertEqual(regressions, ["parse", "load"])
+        self.assertEqual(lines[0], "parse: 70.000 pages/s (-30.0% vs 100.000) REGRESSION")
+        self.assertEqual(lines[3], "new: 1.000 s")
+
+    def test_save_merges(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "baseline.json")
+            save_baseline({"a": result(1.0, "s"), "b": result(2.0, "s")}, path)
+            save_baseline({"b": result(3.0, "s")}, path)
+            self.assertEqual(load_baseline(path)["results"], {"a": result(1.0, "s"), "b": result(3.0, "s")})
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_save_rankings(self):
+        players = fixture_players(250)
+        self.assertEqual(len({p.id for p in players}), 250)
+        cwd = os.getcwd()
+        self.assertGreater(bench_save_rankings(seconds=0.01, rows=250)["save_rankings"]["value"], 0)
+        self.assertEqual(os.getcwd(), cwd)
+
+
+if __name__ == "__main__":
+    unittest.main()
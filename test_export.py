@@ -0,0 +1,59 @@
+import unittest
+import gzip
+import json
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import export
+from archive import player_fields
+from export import export_static, player_shard_path
+from test_archive import make_rows, write_csv
+
+
+def read_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class TestExportStatic(unittest.TestCase):
+    @mock.patch.object(export, "export_page_size", 2)
+    def test_incremental_shards(self):
+        with tempfile.TemporaryDirectory() as d:
+            archive, out = os.path.join(d, "archive"), os.path.join(d, "public")
+            os.makedirs(archive)
+            write_csv(os.path.join(archive, "2026_08_20.csv"), player_fields, make_rows(3, 20))
+            write_csv(os.path.join(archive, "2026_08_21.csv"), player_fields, make_rows(3, 21))
+            # the daily run leaves the backfill to python export.py
+            self.assertEqual(export_static(archive, out, backfill=False), {})
+            self.assertFalse(os.path.exists(out))
+            # 3 player histories, 2 Chaos pages and the index
+            self.assertEqual(export_static(archive, out), {"written": 6, "unchanged": 0, "removed": 0})
+            self.assertEqual(export_static(archive, out, backfill=False), {"written": 0, "unchanged": 6, "removed": 0})
+            self.assertEqual(export_static(archive, out), {"written": 0, "unchanged": 6, "removed": 0})
+
+            index = read_json(os.path.join(out, "leaderboard", "index.json"))
+            self.assertEqual(index["dcs"], {"Chaos": {"players": 3, "pages": 2}})
+            page = read_json(os.path.join(out, "leaderboard", "Chaos", "2.json"))
+            self.assertEqual([row[1] for row in page["rows"]], [1002])
+            with gzip.open(os.path.join(out, "leaderboard", "Chaos", "2.json.gz"), "rt", encoding="utf-8") as f:
+                self.assertEqual(json.load(f), page)
+
+            # a new day where only 1000 is left and renamed: page 2 goes, only 1000's history changes
+            rows = make_rows(1, 22)
+            rows[0] = ("Renamed",) + rows[0][1:]
+            write_csv(os.path.join(archive, "2026_08_22.csv"), player_fields, rows)
+            self.assertEqual(export_static(archive, out), {"written": 3, "unchanged": 2, "removed": 1})
+            self.assertFalse(os.path.exists(os.path.join(out, "leaderboard", "Chaos", "2.json.gz")))
+            history = read_json(player_shard_path(1000, out))
+            self.assertEqual(history["name"], "Renamed")
+            self.assertEqual([entry[0] for entry in history["history"]], ["2026-08-20", "2026-08-21", "2026-08-22"])
+            self.assertEqual(history["history"][-1], ["2026-08-22", "Chaos", "Moogle", 1, 2000, 10, "Crystal", "WHM"])
+            self.assertEqual(len(read_json(player_shard_path(1001, out))["history"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
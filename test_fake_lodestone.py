@@ -0,0 +1,134 @@
+import unittest
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import main
+from fake_lodestone import FakeLodestone, lognormal_latency, serving
+
+
+class TestMainAgainstFakeLodestone(unittest.TestCase):
+    def run_main(self, server: FakeLodestone):
+        with (
+            tempfile.TemporaryDirectory() as d,
+            serving(server, d, rate_scale=1000),
+            patch("main.parse_pool_kind", "none"),
+        ):
+            ok = asyncio.run(main.main())
+            with open(os.path.join("archive", os.listdir("archive")[0]), encoding="utf-8", newline="") as f:
+                rows = list(csv.DictReader(f))
+            with open(os.path.join("metrics", os.listdir("metrics")[0]), encoding="utf-8") as f:
+                self.report = json.load(f)
+        return ok, rows
+
+    def test_full_pipeline(self):
+        server = FakeLodestone(dcs=["Chaos", "Light"], pages=2)
+        ok, rows = self.run_main(server)
+        self.assertTrue(ok)
+        self.assertEqual(len(rows), 4 * server.players_per_page)
+        # every data center's pages are all requested at once, before its page count is known
+        self.assertEqual(server.requests, {"dcs": 1, "ranking": 2 * main.max_ranking_pages, "character": len(rows)})
+        self.assertEqual([row["dc"] for row in rows[:: server.players_per_page]], ["Chaos", "Chaos", "Light", "Light"])
+        self.assertNotIn("UNK", {row["job"] for row in rows})
+
+        report = self.report
+        self.assertTrue(report["ok"])
+        self.assertEqual(set(report["phases"]), {"data_centers", "rankings", "characters", "save", "rollups"})
+        self.assertEqual(report["counters"]["players"], len(rows))
+        endpoints = report["endpoints"]
+        self.assertEqual(endpoints["ranking"]["statuses"], {"200": 2 * main.max_ranking_pages})
+        self.assertEqual(endpoints["character"]["latency"]["count"], len(rows))
+        self.assertEqual(report["bytes"], server.bytes_sent)
+
+    def test_synthetic_pager_matches(self):
+        """The opt-in pager only changes how the pages are found, not what is archived."""
+        _, rows = self.run_main(FakeLodestone(dcs=["Chaos", "Light"], pages=2))
+        ok, paged = self.run_main(FakeLodestone(dcs=["Chaos", "Light"], pages=2, pager=True))
+        self.assertTrue(ok)
+        self.assertEqual(paged, rows)
+
+    def test_streaming_matches(self):
+        """--stream writes the same CSV as collecting every player first."""
+        server = FakeLodestone(dcs=["Chaos", "Light"], pages=2, latency=lognormal_latency(0.002, rng=random.Random(0)))
+        _, rows = self.run_main(server)
+        with patch("main.stream_rankings", True):
+            ok, streamed = self.run_main(server)
+        self.assertTrue(ok)
+        self.assertEqual(streamed, rows)
+
+    def test_shards_merge(self):
+        """Shard runs merged into the archive match one run over every data center."""
+        server = FakeLodestone(dcs=["Chaos", "Light", "Aether"], pages=1)
+        _, rows = self.run_main(server)
+        with (
+            tempfile.TemporaryDirectory() as d,
+            serving(server, d, rate_scale=1000),
+            patch("main.parse_pool_kind", "none"),
+        ):
+            for spec in ("1/2", "2/2"):
+                with patch("main.shard_spec", spec):
+                    self.assertTrue(asyncio.run(main.main()))
+            self.assertEqual(os.listdir("archive"), [])
+            day = datetime.now(timezone.utc).date()
+            self.assertTrue(main.merge_shards(day))
+            with open(os.path.join("archive", os.listdir("archive")[0]), encoding="utf-8", newline="") as f:
+                self.assertEqual(list(csv.DictReader(f)), rows)
+            with open(os.path.join("metrics", os.listdir("metrics")[0]), encoding="utf-8") as f:
+                report = json.load(f)
+            self.assertEqual(report["counters"]["players"], len(rows))
+            self.assertEqual(report["shards"], ["1of2", "2of2"])
+
+            # A player id in two shards fails the merge's duplicate check
+            path = os.path.join("shards", day.strftime("%Y_%m_%d"), "2of2", "rankings.csv")
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            first, second = rows[0]["id"], rows[server.players_per_page]["id"]
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text.replace(second, first, 1))
+            self.assertFalse(main.merge_shards(day))
+
+            # and a data center scraped twice stops it before anything is archived
+            with patch("main.shard_spec", "Light"):
+                asyncio.run(main.main())
+            os.remove(os.path.join("archive", os.listdir("archive")[0]))
+            self.assertFalse(main.merge_shards(day))
+            self.assertEqual(os.listdir("archive"), [])
+
+    def test_runs_start_fresh(self):
+        """Failures and backed-off concurrency left by an earlier run in the process don't carry over."""
+        main.failed_player_fetches.append(1)
+        main.unmapped_job_icons.append(2)
+        main.player_concurrency.limit = main.player_concurrency.peak = 1.0
+        main.player_limiter.errors[429] += 1
+        ok, _ = self.run_main(FakeLodestone(dcs=["Chaos", "Light"], pages=1))
+        self.assertTrue(ok)
+        self.assertGreaterEqual(self.report["concurrency"]["player"]["peak"], 3)
+        self.assertEqual(self.report["limiters"]["player"]["errors"], {})
+
+    def test_retries_injected_errors(self):
+        """429/503s are retried after their Retry-After, and 403s leave the job UNK without failing the run."""
+        server = FakeLodestone(
+            dcs=["Chaos", "Light"], pages=1, errors={403: 0.1, 429: 0.05, 503: 0.05}, retry_after=0.01, seed=1
+        )
+        ok, rows = self.run_main(server)
+        self.assertTrue(ok)
+        self.assertEqual(len(rows), 2 * server.players_per_page)
+        self.assertGreater(server.statuses[429] + server.statuses[503], 0)
+        self.assertEqual(sum(row["job"] == "UNK" for row in rows), server.statuses[403])
+        statuses = Counter()
+        for endpoint in self.report["endpoints"].values():
+            statuses.update({int(status): n for status, n in endpoint["statuses"].items()})
+        self.assertEqual(statuses, server.statuses)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,14 +3,44 @@ import asyncio
 from unittest.mock import Mock, AsyncMock, patch
 import sys
 import os
+import datetime
+import tempfile
 
 # Add the current directory to the path to import main
 sys.path.insert(0, os.path.dirname(__file__))
 
 from main import (
+    AdaptiveConcurrency,
+    Capture,
+    Checkpoint,
+    JobCache,
     Player,
+    RankingsWriter,
+    RateLimiter,
+    ResponseCache,
+    cached_parse,
     get_data_centers,
+    get_dc_rankings,
+    max_ranking_pages,
     get_player,
+    parse_page_count,
+    parse_job_html,
+    parse_pool,
+    parse_ranking_page,
+    run_parse,
+    ranking_parsers,
+    parse_retry_after,
+    player_fields,
+    player_schema,
+    player_limiter,
+    player_url,
+    ranking_url,
+    replay,
+    select_shard,
+    shard_name,
+    stream_player_job,
+    use_job_cache,
+    write_rankings_csv,
     parse_rankings,
     check_duplicate_player_ids,
     count_unknown_jobs,
@@ -25,6 +55,23 @@ class TestPlayer(unittest.TestCase):
         player = Player()
         self.assertIsInstance(player, Player)
 
+    def test_player_is_slotted(self):
+        player = Player()
+        self.assertFalse(hasattr(player, "__dict__"))
+        with self.assertRaises(AttributeError):
+            player.not_a_field = 1
+
+    def test_schema_round_trip(self):
+        """as_row follows the schema order whether or not the job is set, and from_dict restores types."""
+        row = {name: "1" if type_ is int else name for name, type_ in player_schema}
+        player = Player.from_dict(row)
+        self.assertEqual(player.id, 1)
+        self.assertEqual(player.name, "name")
+        self.assertEqual(player.as_dict(), {name: player.as_row()[i] for i, name in enumerate(player_fields)})
+        del player.job
+        self.assertEqual(player.as_row()[-1], "")
+        self.assertNotIn("job", player.as_dict())
+
     def test_parse_rankings_basic(self):
         """Test parsing basic ranking HTML."""
         # Create a mock HTML structure based on the actual structure
@@ -117,6 +164,87 @@ class TestUnknownJobDetection(unittest.TestCase):
         self.assertEqual(count_unknown_jobs(players), 0)
 
 
+class TestJobCache(unittest.TestCase):
+    today = datetime.date(2026, 8, 22)
+
+    def _make_player(self, pid=1, portrait="a.jpg?1", tier="Crystal") -> Player:
+        player = Player()
+        player.id, player.portrait, player.tier = pid, portrait, tier
+        return player
+
+    def _cache(self, job="PLD", fetched="2026-08-21") -> JobCache:
+        return JobCache({1: {"job": job, "portrait": "a.jpg?1", "tier": "Crystal", "fetched": fetched}})
+
+    def test_hit_sets_job(self):
+        cache = self._cache()
+        player = self._make_player()
+        with patch("main.job_cache_refresh_fraction", 0):
+            self.assertTrue(cache.resolve(player, self.today))
+        self.assertEqual(player.job, "PLD")
+        self.assertEqual(cache.hits, 1)
+
+    def test_invalidation_rules(self):
+        cases = {
+            "new": (self._cache(), self._make_player(pid=2)),
+            "unknown": (self._cache(job="UNK"), self._make_player()),
+            "expired": (self._cache(fetched="2026-08-01"), self._make_player()),
+            "portrait": (self._cache(), self._make_player(portrait="b.jpg?1")),
+            "tier": (self._cache(), self._make_player(tier="Diamond")),
+        }
+        for reason, (cache, player) in cases.items():
+            with self.subTest(reason=reason), patch("main.job_cache_refresh_fraction", 0):
+                self.assertFalse(cache.resolve(player, self.today))
+                self.assertEqual(cache.misses, {reason: 1})
+        with patch("main.job_cache_refresh_fraction", 1):
+            cache = self._cache()
+            self.assertFalse(cache.resolve(self._make_player(), self.today))
+            self.assertEqual(cache.misses, {"refresh": 1})
+
+    def test_real_archive_rows(self):
+        """Players from archive/2026_08_21.csv and _22.csv: the daily portrait ?timestamp is not a
+        change, but the cache can't see job changes either, which is why it is off by default."""
+        header = "name,id,cur_rank,prev_rank,world,dc,points,points_delta,portrait,tier,wins,wins_delta,job\n"
+        day_21 = [
+            "Cliffe Zanza,36074329,1,0,Spriggan,Chaos,3131,0,d8d2fa78adb447ec4b6d5d747f5d5f84_feaf0a2e88ff164813fbc9b85876fa48fc0.jpg?1787306588,Ultima,178,0,BLM",
+            "Miyu Moon,58918526,2,0,Moogle,Chaos,3091,0,1abf5ce3756f6fa0d1c5be2cd39491bc_d7a9d5f85a29d6278ec1c7adc2c8d242fc0.jpg?1787306125,Ultima,76,0,SAM",
+            "Scarlet Rose,26616217,3,5,Spriggan,Chaos,2863,249,96ad88f23a708e8d6e391f669986d57c_feaf0a2e88ff164813fbc9b85876fa48fc0.jpg?1787306917,Omega,358,22,MNK",
+        ]
+        day_22 = [
+            "Cliffe Zanza,36074329,1,0,Spriggan,Chaos,3228,97,d8d2fa78adb447ec4b6d5d747f5d5f84_feaf0a2e88ff164813fbc9b85876fa48fc0.jpg?1787395219,Ultima,182,4,MNK",
+            "Miyu Moon,58918526,2,0,Moogle,Chaos,3093,2,1abf5ce3756f6fa0d1c5be2cd39491bc_d7a9d5f85a29d6278ec1c7adc2c8d242fc0.jpg?1787392335,Ultima,78,2,SAM",
+            "Scarlet Rose,26616217,3,0,Spriggan,Chaos,2863,0,96ad88f23a708e8d6e391f669986d57c_feaf0a2e88ff164813fbc9b85876fa48fc0.jpg?1787393159,Omega,376,18,PLD",
+        ]
+        with tempfile.TemporaryDirectory() as d:
+            with open(os.path.join(d, "2026_08_21.csv"), "w", encoding="utf-8") as f:
+                f.write(header + "\n".join(day_21) + "\n")
+            cache = JobCache.load(os.path.join(d, "job_cache.json"), archive_dir=d)
+        fetched = [Player.from_dict(dict(zip(header.strip().split(","), line.split(",")))) for line in day_22]
+        players = [Player.from_dict({k: v for k, v in p.as_dict().items() if k != "job"}) for p in fetched]
+        with patch("main.job_cache_refresh_fraction", 0):
+            self.assertEqual([cache.resolve(p, self.today) for p in players], [True, True, True])
+        stale = [p.name for p, truth in zip(players, fetched) if p.job != truth.job]
+        self.assertEqual(stale, ["Cliffe Zanza", "Scarlet Rose"])
+        self.assertFalse(use_job_cache)
+
+    def test_seed_from_archive_and_roundtrip(self):
+        with tempfile.TemporaryDirectory() as d:
+            with open(os.path.join(d, "2026_08_21.csv"), "w", encoding="utf-8") as f:
+                f.write("name,id,portrait,tier,job\nA,1,a.jpg?1,Crystal,PLD\n")
+            path = os.path.join(d, "job_cache.json")
+            cache = JobCache.load(path, archive_dir=d)
+            self.assertEqual(cache.entries[1]["fetched"], "2026-08-21")
+
+            player = self._make_player(pid=2)
+            player.job = "WHM"
+            cache.store(player, self.today)
+            cache.entries[3] = dict(cache.entries[1], fetched="2026-01-01")
+            cache.save(self.today, path)
+
+            reloaded = JobCache.load(path, archive_dir=d)
+            self.assertEqual(sorted(reloaded.entries), [1, 2])
+            self.assertEqual(reloaded.entries[2]["job"], "WHM")
+
+
 class TestDataCenterParsing(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.client = AsyncMock(spec=httpx.AsyncClient)
@@ -141,6 +269,7 @@ class TestDataCenterParsing(unittest.IsolatedAsyncioTestCase):
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.text = mock_html
+        mock_response.num_bytes_downloaded = len(mock_html)
         self.client.get.return_value = mock_response
         
         dcs = await get_data_centers(self.client)
@@ -152,6 +281,7 @@ class TestDataCenterParsing(unittest.IsolatedAsyncioTestCase):
         """Test handling of HTTP errors when fetching data centers."""
         mock_response = Mock()
         mock_response.status_code = 500
+        mock_response.num_bytes_downloaded = 0
         self.client.get.return_value = mock_response
         
         with self.assertRaises(httpx.HTTPError):
@@ -164,6 +294,7 @@ class TestDataCenterParsing(unittest.IsolatedAsyncioTestCase):
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.text = mock_html
+        mock_response.num_bytes_downloaded = len(mock_html)
         self.client.get.return_value = mock_response
         
         dcs = await get_data_centers(self.client)
@@ -178,6 +309,7 @@ class TestGetPlayer(unittest.IsolatedAsyncioTestCase):
         """A 403 (private/blocked profile) should return "" instead of raising or retrying."""
         mock_response = Mock()
         mock_response.status_code = 403
+        mock_response.num_bytes_downloaded = 0
         self.client.get.return_value = mock_response
 
         result = await get_player(self.client, 12345)
@@ -185,6 +317,144 @@ class TestGetPlayer(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result, "")
         self.client.get.assert_called_once()
 
+    async def test_get_player_429_honours_retry_after(self):
+        """A 429 should pause the shared limiter for Retry-After and then retry."""
+        throttled = Mock(status_code=429, headers={"Retry-After": "0.05"}, num_bytes_downloaded=0)
+        ok = Mock(status_code=200, text="page", num_bytes_downloaded=4)
+        self.client.get.side_effect = [throttled, ok]
+        retries = player_limiter.retries
+
+        result = await get_player(self.client, 12345)
+
+        self.assertEqual(result, "page")
+        self.assertEqual(self.client.get.call_count, 2)
+        self.assertEqual(player_limiter.retries, retries + 1)
+
+
+class TestAdaptiveConcurrency(unittest.IsolatedAsyncioTestCase):
+    def test_additive_increase_up_to_ceiling(self):
+        limiter = RateLimiter(calls=3, period=1)
+        controller = AdaptiveConcurrency(initial=3, ceiling=5, limiter=limiter)
+        for _ in range(100):
+            controller.on_success(0.3)
+        self.assertEqual(controller.limit, 5)
+        self.assertAlmostEqual(limiter.rate, 5)
+
+    def test_multiplicative_decrease_once_per_round(self):
+        controller = AdaptiveConcurrency(initial=4, ceiling=8)
+        controller.since_decrease = 4
+        controller.on_error(throttled=True)
+        controller.on_error(throttled=True)
+        self.assertEqual(controller.limit, 2)
+        self.assertEqual(controller.decreases, {"throttled": 1})
+
+    def test_reset_starts_over(self):
+        limiter = RateLimiter(calls=4, period=1)
+        concurrency = AdaptiveConcurrency(initial=2, ceiling=8, limiter=limiter)
+        for _ in range(20):
+            concurrency.on_success(0.2)
+        concurrency.on_error(throttled=True)
+        concurrency.reset()
+        self.assertEqual((concurrency.limit, concurrency.peak), (2.0, 2.0))
+        self.assertEqual((concurrency.decreases, concurrency.best_latency), ({}, float("inf")))
+        self.assertEqual(limiter.rate, 4.0)
+
+    def test_latency_spike_backs_off(self):
+        controller = AdaptiveConcurrency(initial=4, ceiling=8)
+        for _ in range(10):
+            controller.on_success(0.3)
+        limit = controller.limit
+        for _ in range(10):
+            controller.on_success(3.0)
+        self.assertLess(controller.limit, limit)
+        self.assertIn("latency", controller.decreases)
+
+    async def test_slots_bound_in_flight(self):
+        controller = AdaptiveConcurrency(initial=2, ceiling=2)
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with controller.slot():
+                peak = max(peak, controller.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request() for _ in range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(controller.in_flight, 0)
+
+
+class TestStreamPlayerJob(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        path = os.path.join(os.path.dirname(__file__), "test_data", "player_28151111.html")
+        with open(path, "rb") as f:
+            self.page = f.read()
+        self.chunks_sent = 0
+
+    def client(self, status_code=200):
+        async def body():
+            for i in range(0, len(self.page), 4096):
+                self.chunks_sent += 1
+                yield self.page[i : i + 4096]
+
+        def handler(request):
+            return httpx.Response(status_code, content=body())
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def test_stops_after_class_icon(self):
+        """The stream should be abandoned after the icon and yield the same job as the full page."""
+        async with self.client() as client:
+            snippet = await stream_player_job(client, 28151111)
+
+        self.assertLess(self.chunks_sent, len(self.page) // 4096 // 2)
+        self.assertIn("character__class_icon", snippet)
+        streamed, full = Player(), Player()
+        self.assertEqual(
+            streamed.parse_job(BeautifulSoup(snippet, "html.parser")),
+            full.parse_job(BeautifulSoup(self.page, "html.parser")),
+        )
+        self.assertEqual(streamed.job, full.job)
+
+    async def test_403_returns_empty_string(self):
+        async with self.client(403) as client:
+            self.assertEqual(await stream_player_job(client, 28151111), "")
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_waits_once_bucket_is_empty(self):
+        """Calls beyond the bucket capacity should wait on the event loop and be counted."""
+        limiter = RateLimiter(calls=2, period=0.1)
+        for _ in range(3):
+            await limiter.acquire()
+        self.assertEqual(limiter.waits, 1)
+        self.assertAlmostEqual(limiter.wait_time, 0.05, delta=0.01)
+
+    async def test_defer_pauses_bucket(self):
+        limiter = RateLimiter(calls=10, period=1)
+        limiter.defer(0.05)
+        await limiter.acquire()
+        self.assertEqual(limiter.waits, 1)
+        self.assertGreater(limiter.wait_time, 0.04)
+
+    async def test_defer_holds_back_waiting_callers(self):
+        """A Retry-After that arrives while callers sleep for a token delays them too."""
+        limiter = RateLimiter(calls=1, period=0.05)
+        await limiter.acquire()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        limiter.defer(0.2)
+        await waiting
+        self.assertGreater(loop.time() - started, 0.2)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
 
 class TestDuplicateDetection(unittest.TestCase):
     def _make_player(self, pid: int, name: str) -> Player:
@@ -271,6 +541,358 @@ class TestMainIntegration(unittest.TestCase):
         self.assertEqual(players[1].dc, "DC2")
 
 
+def ranking_page(ids, pager=""):
+    rows = "".join(
+        f"""
+        <div class="ranking_set" data-href="/lodestone/character/{pid}/">
+            <h3>Player {pid}</h3>
+            <div class="order">{pid}</div>
+            <div class="prev_order"></div>
+            <div class="world">World [DC]</div>
+            <div class="points">1000</div>
+            <div class="face-wrapper"><img src="https://img2.finalfantasyxiv.com/f/{pid}.jpg"/></div>
+            <div class="tier"><img data-tooltip="Crystal"/></div>
+            <div class="wins">10</div>
+        </div>"""
+        for pid in ids
+    )
+    return f"<html><body>{rows}{pager}</body></html>"
+
+
+class TestRankingPagination(unittest.IsolatedAsyncioTestCase):
+    def test_parse_page_count(self):
+        pager = '<ul class="btn__pager"><li><span class="btn__pager__current">Page 1 of 4</span></li></ul>'
+        self.assertEqual(parse_page_count(BeautifulSoup(pager, "html.parser")), 4)
+        links = '<a href="?dcgroup=Chaos&page=2">2</a><a href="?dcgroup=Chaos&page=5">&raquo;</a>'
+        self.assertEqual(parse_page_count(BeautifulSoup(links, "html.parser")), 5)
+        self.assertIsNone(parse_page_count(BeautifulSoup(ranking_page([1]), "html.parser")))
+
+    async def test_get_dc_rankings_uses_page_count(self):
+        """Only the pages announced by page 1's pager are kept, and players come back in rank order."""
+        pager = '<span class="btn__pager__current">Page 1 of 3</span>'
+        pages = {1: ranking_page([1, 2], pager), 2: ranking_page([3, 4], pager), 3: ranking_page([5, 6], pager)}
+
+        async def fake_get_ranking(client, dc, page):
+            await asyncio.sleep(0.01 * (7 - page))  # later pages finish first
+            return pages.get(page, ranking_page([10 * page], pager))
+
+        with patch("main.get_ranking", side_effect=fake_get_ranking):
+            players = await get_dc_rankings(None, "Chaos")
+
+        self.assertEqual([p.id for p in players], [1, 2, 3, 4, 5, 6])
+
+    async def test_get_dc_rankings_hands_off_each_page(self):
+        """on_page should see every page's players as it is parsed, before the data center is done."""
+        pager = '<span class="btn__pager__current">Page 1 of 2</span>'
+        pages = {1: ranking_page([1, 2], pager), 2: ranking_page([3], pager)}
+        seen = []
+
+        async def on_page(dc, page, players):
+            seen.append((dc, page, [p.id for p in players]))
+
+        async def fake_get_ranking(client, dc, page):
+            return pages[page]
+
+        with patch("main.get_ranking", side_effect=fake_get_ranking):
+            await get_dc_rankings(None, "Chaos", on_page)
+
+        self.assertEqual(seen, [("Chaos", 1, [1, 2]), ("Chaos", 2, [3])])
+
+    async def test_get_dc_rankings_without_pager(self):
+        """Like on Lodestone: every page is fetched at once, and the data center ends at its first short page."""
+        pages = {1: ranking_page([1, 2]), 2: ranking_page([3, 4]), 3: ranking_page([5]), 4: ranking_page([])}
+        seen = []
+
+        async def on_page(dc, page, players):
+            seen.append(page)
+
+        async def fake_get_ranking(client, dc, page):
+            await asyncio.sleep(0.01 * (7 - page))  # later pages finish first
+            return pages.get(page, ranking_page([]))
+
+        with patch("main.get_ranking", side_effect=fake_get_ranking) as get_ranking:
+            players = await get_dc_rankings(None, "Chaos", on_page)
+
+        self.assertEqual([p.id for p in players], [1, 2, 3, 4, 5])
+        self.assertEqual(seen, [1, 2, 3])
+        self.assertEqual(get_ranking.call_count, max_ranking_pages)
+
+    async def test_get_dc_rankings_stops_at_empty_or_repeated_page(self):
+        for later in (ranking_page([]), ranking_page([1, 2])):
+            async def fake_get_ranking(client, dc, page):
+                return ranking_page([1, 2]) if page == 1 else later
+
+            with self.subTest(later=later), patch("main.get_ranking", side_effect=fake_get_ranking):
+                players = await get_dc_rankings(None, "Chaos")
+            self.assertEqual([p.id for p in players], [1, 2])
+
+    async def test_get_dc_rankings_warns_about_dropped_pages(self):
+        pager = f'<span class="btn__pager__current">Page 1 of {max_ranking_pages + 2}</span>'
+
+        async def fake_get_ranking(client, dc, page):
+            return ranking_page([page], pager)
+
+        with patch("main.get_ranking", side_effect=fake_get_ranking), self.assertLogs(level="WARNING") as logged:
+            players = await get_dc_rankings(None, "Chaos")
+        self.assertEqual([p.id for p in players], list(range(1, max_ranking_pages + 1)))
+        self.assertIn(f"only fetching the first {max_ranking_pages}", logged.output[0])
+
+
+class TestRankingParsers(unittest.TestCase):
+    """Every ranking parser backend must produce exactly what the full-soup backend does."""
+
+    def assertBackendsAgree(self, html):
+        expected_players, expected_pages = parse_ranking_page(html, "soup")
+        for backend in ranking_parsers:
+            with self.subTest(backend=backend):
+                players, pages = parse_ranking_page(html, backend)
+                self.assertEqual([p.as_dict() for p in players], [p.as_dict() for p in expected_players])
+                self.assertEqual(pages, expected_pages)
+        return expected_players, expected_pages
+
+    def test_fixture(self):
+        path = os.path.join(os.path.dirname(__file__), "test_data", "ranking_elemental.html")
+        with open(path, encoding="utf-8") as f:
+            players, _ = self.assertBackendsAgree(f.read())
+        self.assertEqual(len(players), 100)
+        self.assertEqual(players[0].name, "Sweet Dreams")
+
+    def test_deltas_entities_and_pager(self):
+        html = """
+        <div class="cc-ranking__table">
+        <div class="ranking_set"  data-href="/lodestone/character/111/">
+            <div class="order"> 7 </div>
+            <div class="prev_order"><!-- none --></div>
+            <div class="face"><div class="face-wrapper"><img src="https://img2.finalfantasyxiv.com/f/a.jpg?1&amp;2"></div></div>
+            <div class="name"><h3>A&#39;lice &amp; Bob</h3>
+                <span class="world"><i class="xiv-lds" data-tooltip="Home World"></i>Moogle [Chaos]</span></div>
+            <div class="tier"></div>
+            <div class="points"><div><p>1500 -12</p></div></div>
+            <div class="wins"><div><p>30 +1</p></div></div>
+        </div>
+        </div>
+        <ul class="btn__pager"><li><span class="btn__pager__current">Page 1 of 6</span></li>
+        <li><a href="?dcgroup=Chaos&amp;page=6" class="btn__pager__next--all"></a></li></ul>
+        """
+        players, pages = self.assertBackendsAgree(html)
+        self.assertEqual(pages, 6)
+        self.assertEqual(players[0].name, "A'lice & Bob")
+        self.assertEqual(players[0].tier, "None")
+        self.assertEqual(players[0].points_delta, -12)
+        self.assertEqual(players[0].portrait, "a.jpg?1&2")
+
+
+class TestParsePool(unittest.IsolatedAsyncioTestCase):
+    async def test_pools_return_same_records(self):
+        """Parsing on a process or thread pool should return the same records as parsing inline."""
+        path = os.path.join(os.path.dirname(__file__), "test_data", "ranking_elemental.html")
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        icon = '<div class="character__class_icon"><img src="https://img.finalfantasyxiv.com/h/E/d0Tx-vhnsMYfYpGe9MvslemEfg.png"/></div>'
+        inline_players, _ = await run_parse(parse_ranking_page, html)
+        for kind in ("process", "thread"):
+            with self.subTest(kind=kind), patch("main.parse_pool_kind", kind), patch("main.parse_pool_size", 2):
+                async with parse_pool() as executor:
+                    self.assertIsNotNone(executor)
+                    players, _ = await run_parse(parse_ranking_page, html)
+                    self.assertEqual(await run_parse(parse_job_html, icon), ("PLD", False))
+                self.assertEqual([p.as_dict() for p in players], [p.as_dict() for p in inline_players])
+
+
+class TestCheckpoint(unittest.IsolatedAsyncioTestCase):
+    async def test_resume_skips_journaled_pages_and_jobs(self):
+        pager = '<span class="btn__pager__current">Page 1 of 2</span>'
+        pages = {1: ranking_page([1, 2], pager), 2: ranking_page([3], pager)}
+
+        async def fake_get_ranking(client, dc, page):
+            return pages[page]
+
+        with tempfile.TemporaryDirectory() as d:
+            today = datetime.date(2026, 8, 22)
+            open(os.path.join(d, "2026_08_21.jsonl"), "w").close()
+            checkpoint = Checkpoint.for_day(today, d)
+            with patch("main.get_ranking", side_effect=fake_get_ranking):
+                first_run = await get_dc_rankings(None, "Chaos", checkpoint=checkpoint)
+            expected = [p.as_dict() for p in first_run]
+            first_run[0].job = "PLD"
+            checkpoint.record_job(first_run[0])
+            checkpoint.close()
+            self.assertEqual(os.listdir(d), ["2026_08_22.jsonl"])
+
+            resumed = Checkpoint.for_day(today, d)
+            with patch("main.get_ranking", side_effect=fake_get_ranking) as get_ranking:
+                players = await get_dc_rankings(None, "Chaos", checkpoint=resumed)
+            get_ranking.assert_not_called()
+            self.assertEqual([p.as_dict() for p in players], expected)
+            self.assertTrue(resumed.resolve(players[0]))
+            self.assertEqual(players[0].job, "PLD")
+            self.assertFalse(resumed.resolve(players[1]))
+
+            resumed.finish()
+            self.assertEqual(os.listdir(d), [])
+
+
+class TestRankingsWriter(unittest.TestCase):
+    def test_out_of_order_finishes_match_save(self):
+        """Pages and jobs finishing in any order still give the CSV write_rankings_csv would, holding only what must wait."""
+        def player(pid, dc):
+            return Player.from_dict({"id": pid, "name": f"P{pid}", "dc": dc, "cur_rank": pid % 100, "job": "PLD"})
+
+        chaos = [[player(i, "Chaos") for i in (1, 2)], [player(3, "Chaos")]]
+        light = [[player(101, "Light")], []]
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "2026_08_22.csv")
+            writer = RankingsWriter(path, ["Chaos", "Light"])
+            writer.add_page("Chaos", 2, chaos[1])
+            writer.add_page("Light", 1, light[0])
+            writer.finish(chaos[1][0])
+            writer.finish(light[0][0])
+            writer.add_page("Light", 2, light[1])
+            self.assertEqual((writer.rows, writer.held()), (1, 1))  # Light is done, Chaos waits for page 1
+            writer.add_page("Chaos", 1, chaos[0])
+            writer.finish(chaos[0][1])
+            self.assertEqual(writer.rows, 1)
+            self.assertFalse(os.path.exists(path))
+            writer.finish(chaos[0][0])
+            self.assertEqual((writer.rows, writer.held()), (4, 0))
+            self.assertEqual(writer.close(), 4)
+            self.assertEqual(os.listdir(d), ["2026_08_22.csv"])
+
+            expected = os.path.join(d, "expected.csv")
+            write_rankings_csv(expected, chaos[0] + chaos[1] + light[0])
+            with open(path, "rb") as f, open(expected, "rb") as g:
+                self.assertEqual(f.read(), g.read())
+
+    def test_unfinished_player_fails_close(self):
+        with tempfile.TemporaryDirectory() as d:
+            writer = RankingsWriter(os.path.join(d, "2026_08_22.csv"), ["Chaos"])
+            writer.add_page("Chaos", 1, [Player.from_dict({"id": 1, "dc": "Chaos"})])
+            with self.assertRaises(RuntimeError):
+                writer.close()
+            self.assertFalse(os.path.exists(os.path.join(d, "2026_08_22.csv")))
+
+
+class TestShardSpec(unittest.TestCase):
+    def test_select_shard(self):
+        dcs = ["Aether", "Chaos", "Crystal", "Light", "Primal"]
+        shards = [select_shard(dcs, f"{k}/2") for k in (1, 2)]
+        self.assertEqual(shards, [["Aether", "Crystal", "Primal"], ["Chaos", "Light"]])
+        self.assertEqual(select_shard(dcs, "Light, Chaos"), ["Chaos", "Light"])
+        self.assertEqual((shard_name("2/4"), shard_name("Chaos,Light")), ("2of4", "Chaos+Light"))
+        for bad in ("Mana", "0/2", "3/2", ","):
+            with self.assertRaises(ValueError):
+                select_shard(dcs, bad)
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    async def test_conditional_get_and_unchanged_content(self):
+        """A 304 or an identical body should reuse the last job; a changed body is parsed."""
+        pld = '<div class="character__class_icon"><img src="https://img.finalfantasyxiv.com/h/E/d0Tx-vhnsMYfYpGe9MvslemEfg.png"/></div>'
+        bodies = [pld, None, pld, "<html></html>"]
+        requests = []
+
+        def handler(request):
+            requests.append(request.headers)
+            body = bodies[len(requests) - 1]
+            if body is None:
+                return httpx.Response(304)
+            return httpx.Response(200, text=body, headers={"ETag": f'"v{len(requests)}"'})
+
+        cache = ResponseCache({})
+        jobs = []
+        with patch("main.response_cache", cache), patch.object(player_limiter, "tokens", 100.0):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                for _ in bodies:
+                    with patch("main.parse_job_html", wraps=parse_job_html) as parse:
+                        job = await cached_parse(player_url(1), await get_player(client, 1), parse)
+                    jobs.append((job[0], parse.call_count))
+
+        self.assertEqual(jobs, [("PLD", 1), ("PLD", 0), ("PLD", 0), ("UNK", 1)])
+        self.assertNotIn("If-None-Match", requests[0])
+        self.assertEqual([h.get("If-None-Match") for h in requests[1:]], ['"v1"', '"v1"', '"v3"'])
+        self.assertEqual(cache.summary(), "1 not modified, 1 unchanged, 2 parsed")
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "responses.json")
+            cache.save(datetime.date.today(), path)
+            self.assertEqual(len(ResponseCache.load(path).entries), 1)
+            cache.save(datetime.date.today() + datetime.timedelta(days=31), path)
+            self.assertEqual(ResponseCache.load(path).entries, {})
+
+    async def test_ranking_pages_not_cached(self):
+        """Ranking pages change daily, so they are fetched without validators and never stored."""
+        requests = []
+
+        def handler(request):
+            requests.append(request.headers)
+            return httpx.Response(200, text=ranking_page([1, 2]), headers={"ETag": '"v1"'})
+
+        cache = ResponseCache({})
+        with patch("main.response_cache", cache), patch("main.max_ranking_pages", 1):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                for _ in range(2):
+                    players = await get_dc_rankings(client, "Chaos")
+        self.assertEqual([p.id for p in players], [1, 2])
+        self.assertEqual([h.get("If-None-Match") for h in requests], [None, None])
+        self.assertEqual((cache.entries, cache.validators), ({}, {}))
+
+    async def test_parser_changes_invalidate(self):
+        """Unmapped job icons are never cached, and a jobicomap change drops older results and their validators."""
+        url = player_url(1)
+        page = '<div class="character__class_icon"><img src="https://img.finalfantasyxiv.com/h/Z/new_job.png"/></div>'
+        cache = ResponseCache({})
+        with patch("main.response_cache", cache):
+            keep = lambda job: not job[1]
+            self.assertEqual(await cached_parse(url, page, parse_job_html, keep), ("UNK", True))
+            self.assertEqual(cache.entries, {})
+
+            with patch.dict("main.jobicomap", {"/h/Z/new_job.png": "VPR"}):
+                cache = ResponseCache({})
+                cache.validators[url] = {"etag": '"v1"', "last_modified": ""}
+                with patch("main.response_cache", cache):
+                    self.assertEqual(await cached_parse(url, page, parse_job_html, keep), ("VPR", False))
+                    self.assertEqual(cache.request_headers(url), {"If-None-Match": '"v1"'})
+                entries = cache.entries
+
+            # the same entry, read by a parser whose jobicomap lacks the icon
+            cache = ResponseCache(entries)
+            self.assertEqual(cache.request_headers(url), {})
+            self.assertIsNone(cache.result(url, page, datetime.date.today()))
+            self.assertFalse(cache.response(url, httpx.Response(304)))
+
+
+class TestCaptureReplay(unittest.TestCase):
+    def test_replay_capture_offline(self):
+        pager = '<span class="btn__pager__current">Page 1 of 2</span>'
+        icon = '<div class="character__class_icon"><img src="https://img.finalfantasyxiv.com/h/E/d0Tx-vhnsMYfYpGe9MvslemEfg.png"/></div>'
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "2026_08_22.jsonl.gz")
+            capture = Capture(path)
+            capture.write("https://eu.finalfantasyxiv.com/lodestone/ranking/crystallineconflict/", '<a href="?dcgroup=Chaos">Chaos</a><a href="?dcgroup=Light">Light</a>')
+            capture.write(ranking_url("Chaos", 1), ranking_page([1, 2], pager))
+            capture.write(ranking_url("Light", 1), ranking_page([4]))
+            capture.write(ranking_url("Chaos", 2), ranking_page([3], pager))
+            capture.write(player_url(1), icon)
+            capture.write(player_url(2), "")
+            capture.close()
+            # a torn final record from a crashed run is ignored
+            with open(path, "ab") as f:
+                f.write(b"\x1f\x8b\x08\x00")
+            self.assertEqual(len(list(Capture.read(path))), 6)
+
+            archive = os.path.join(d, "archive")
+            os.makedirs(archive)
+            with open(os.path.join(archive, "2026_08_22.csv"), "w", encoding="utf-8", newline="") as f:
+                f.write(",".join(player_fields) + "\r\n")
+                f.write("Player 3,3,3,0,World,DC,1000,0,3.jpg,Crystal,10,0,WHM\r\n")
+            output = os.path.join(d, "out.csv")
+            with patch("main.archive_dir", archive):
+                players = replay(path, output, workers=2)
+            self.assertEqual([(p.id, p.job) for p in players], [(1, "PLD"), (2, "UNK"), (3, "WHM"), (4, "UNK")])
+            with open(output, encoding="utf-8") as f:
+                self.assertEqual(len(f.readlines()), 5)
+
+
 class TestAsyncMethods(unittest.IsolatedAsyncioTestCase):
     """Test class for async methods using IsolatedAsyncioTestCase."""
     
@@ -290,6 +912,7 @@ class TestAsyncMethods(unittest.IsolatedAsyncioTestCase):
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.text = mock_html
+        mock_response.num_bytes_downloaded = len(mock_html)
         client.get.return_value = mock_response
         
         dcs = await get_data_centers(client)
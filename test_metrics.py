@@ -0,0 +1,65 @@
+import unittest
+import os
+import sys
+import tempfile
+from datetime import date
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from metrics import Histogram, RunMetrics, merge_reports, read_reports, trend, write_report
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_and_quantiles(self):
+        histogram = Histogram(bounds=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 0.7, 3.0):
+            histogram.observe(value)
+        summary = histogram.as_dict()
+        self.assertEqual(summary["buckets"], [[0.1, 2], [1.0, 2], [None, 1]])
+        self.assertEqual((summary["count"], summary["min"], summary["max"]), (5, 0.05, 3.0))
+        self.assertEqual((summary["p50"], summary["p90"]), (0.5, 3.0))
+        self.assertIsNone(Histogram().as_dict()["p50"])
+
+
+class TestRunMetrics(unittest.TestCase):
+    def test_report_round_trip(self):
+        metrics = RunMetrics()
+        with metrics.phase("rankings"):
+            metrics.request("ranking", 0.2)
+            metrics.response("ranking", httpx.Response(200))
+            metrics.request("ranking", 0.4)
+            metrics.response("ranking", httpx.Response(429))
+        metrics.counters["players"] = 30
+        with tempfile.TemporaryDirectory() as d:
+            write_report(date(2026, 8, 22), metrics.report(limiters={"ranking": {"retries": 1}}), d)
+            reports = read_reports(d)
+        self.assertEqual([report["day"] for report in reports], ["2026-08-22"])
+        report = reports[0]
+        self.assertEqual(set(report["phases"]), {"rankings"})
+        self.assertEqual(report["endpoints"]["ranking"]["statuses"], {"200": 1, "429": 1})
+        self.assertEqual(report["endpoints"]["ranking"]["latency"]["count"], 2)
+        self.assertIn("2026-08-22", trend(reports))
+
+    def test_merge_shard_reports(self):
+        reports = {}
+        for shard, latencies in (("1of2", (0.1, 0.2)), ("2of2", (0.6,))):
+            metrics = RunMetrics()
+            for latency in latencies:
+                metrics.request("character", latency)
+                metrics.response("character", httpx.Response(200))
+            metrics.counters["players"] = len(latencies)
+            reports[shard] = metrics.report(limiters={"player": {"retries": 1}})
+        merged = merge_reports(reports, ok=True)
+        character = merged["endpoints"]["character"]
+        self.assertEqual(character["statuses"], {"200": 3})
+        self.assertEqual((character["latency"]["count"], character["latency"]["max"]), (3, 0.6))
+        self.assertEqual(sum(n for _, n in character["latency"]["buckets"]), 3)
+        self.assertEqual(merged["counters"], {"players": 3})
+        self.assertEqual(set(merged["limiters"]), {"1of2/player", "2of2/player"})
+        self.assertTrue(merged["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from main import parse_job_html
+from profiling import profile_run, profiled_call
+
+test_data = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def stall():
+    time.sleep(0.3)
+
+
+class TestProfileRun(unittest.TestCase):
+    def test_reports(self):
+        with open(os.path.join(test_data, "player_28151111.html"), encoding="utf-8") as f:
+            html = f.read()
+
+        with tempfile.TemporaryDirectory() as d:
+
+            async def run():
+                stall()
+                with concurrent.futures.ProcessPoolExecutor(1) as pool:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(pool, profiled_call, d, parse_job_html, html)
+
+            self.assertEqual(profile_run(run, d), parse_job_html(html))
+            self.assertEqual(
+                sorted(os.listdir(d)),
+                ["loop.prof", "loop.txt", "memory.txt", "parse.prof", "parse.txt", "stalls.txt", "summary.json"],
+            )
+            with open(os.path.join(d, "summary.json"), encoding="utf-8") as f:
+                summary = json.load(f)
+            with open(os.path.join(d, "parse.txt"), encoding="utf-8") as f:
+                self.assertIn("parse_job_html", f.read())
+            with open(os.path.join(d, "stalls.txt"), encoding="utf-8") as f:
+                self.assertIn("test_profiling.py", f.read())
+        self.assertEqual(summary["stalls"], 1)
+        self.assertGreater(summary["stall_seconds"], 0.1)
+        self.assertGreater(summary["peak_traced_bytes"], len(html))
+
+
+if __name__ == "__main__":
+    unittest.main()